@@ -1,9 +1,22 @@
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional, List
 
 class Settings(BaseSettings):
+    # Environment ("dev" serves uploads from the app; anything else defers to the proxy)
+    ENV: str = "dev"
+    
     # Database
     DATABASE_URL: str
+    AUTO_CREATE_TABLES: bool = True  # Run create_all on startup; disable when schema is migrated
+    DB_POOL_SIZE: int = 20  # persistent connections per process
+    DB_MAX_OVERFLOW: int = 10  # extra connections opened under bursts, closed when returned
+    DB_POOL_RECYCLE_SECONDS: int = 3600  # replace connections before the server's idle timeout
+    DB_NULL_POOL: bool = False  # no app-side pooling, e.g. behind PgBouncer in transaction mode
+    
+    # Startup logging
+    DEBUG_STARTUP_LOG: bool = False  # Print the full route table on each worker boot
     
     # Security
     SECRET_KEY: str
@@ -11,29 +24,49 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # LLM provider: "huggingface" or "openai"
+    LLM_BACKEND: str = "huggingface"
+    
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o-mini"  # used for every request when LLM_BACKEND is "openai"
     
     # Hugging Face
     HUGGINGFACEHUB_API_TOKEN: Optional[str] = None   # 👈 added
+    LLM_MAX_CONCURRENCY: int = 4  # in-flight LLM requests per process
+    LLM_TOKENS_PER_MINUTE: int = 60000  # prompt + completion token budget
+    LLM_MAX_RETRIES: int = 3  # retries on 429/5xx/timeouts, exponential backoff
+    LLM_CACHE_SIZE: int = 256  # responses kept in the in-process LRU (0 disables)
+    LLM_TIMEOUT_SECONDS: float = 120.0  # per request; a hung call is retried instead of holding a slot
     
     # File Storage
     UPLOAD_DIRECTORY: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
-    ALLOWED_FILE_TYPES: List[str] = ["pdf"]
+    ALLOWED_FILE_TYPES: List[str] = Field(default_factory=lambda: ["pdf"])
+    
+    # Document processing (in-process queue workers, used when REDIS_URL is not set)
+    DOCUMENT_WORKERS: int = 4
+    PDF_WORKERS: int = 2  # processes per app worker for PDF text extraction
     
     # Redis (optional)
     REDIS_URL: Optional[str] = None
+    RESPONSE_CACHE_TTL_SECONDS: int = 300  # quiz list/detail responses cached in Redis
+    REDIS_TIMEOUT_SECONDS: float = 1.0  # connect/read timeout for cache calls; a slow Redis falls back to the DB
+    QUIZ_QUESTIONS_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # generated questions per document text + style
     
     # CORS
-    BACKEND_CORS_ORIGINS: List[str] = [
+    BACKEND_CORS_ORIGINS: List[str] = Field(default_factory=lambda: [
         "http://localhost:3000",
         "http://localhost:3001",
         "http://localhost:8080"
-    ]
+    ])
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
+    # Read-only after load: the one cached instance is shared process-wide
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", frozen=True)
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build Settings once per process; use as a FastAPI dependency to allow overrides in tests"""
+    return Settings()
 
-settings = Settings()
+settings = get_settings()
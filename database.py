@@ -1,10 +1,38 @@
+import orjson
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+url = make_url(settings.DATABASE_URL)
+
+def json_serializer(value) -> str:
+    """orjson for JSON/JSONB columns; non-str keys (e.g. question ids) become strings, as with json.dumps"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+# Stale connections (server restarts, MySQL wait_timeout) are detected on checkout
+# instead of failing the request
+engine_options = {"pool_pre_ping": True, "json_serializer": json_serializer, "json_deserializer": orjson.loads}
+if settings.DB_NULL_POOL:
+    # An external pooler (PgBouncer) multiplexes connections; holding idle ones here would defeat it
+    engine_options["poolclass"] = NullPool
+elif url.get_backend_name() != "sqlite":
+    # Sized for the sync endpoints running concurrently in the threadpool
+    engine_options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS
+    )
+
+if url.get_driver_name() == "psycopg2":
+    # Batch executemany() UPDATE/DELETE with execute_batch; INSERTs already use
+    # multi-row VALUES (insertmanyvalues), 1000 rows per statement
+    engine_options.update(executemany_mode="values_plus_batch", insertmanyvalues_page_size=1000)
+
+engine = create_engine(settings.DATABASE_URL, **engine_options)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
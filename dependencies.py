@@ -8,7 +8,9 @@ from services.auth_service import AuthService
 
 security = HTTPBearer()
 
-async def get_current_user(
+# Handlers and dependencies that only touch the (synchronous) DB session are plain
+# `def` so FastAPI runs them in its threadpool instead of blocking the event loop.
+def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
@@ -1,41 +1,32 @@
 # main.py - Updated with proper imports and relationships
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import relationship
 from database import engine, Base
 from config import settings
-from routers import auth, assessment, documents, quizzes
 import os
 import time
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+from urllib.parse import quote
 
-# Import all models to ensure they're registered with SQLAlchemy
-from models.user import User
-from models.document import Document
-from models.quiz import Quiz, Question, QuizSubmission
+def register_routers(app: FastAPI):
+    """Import the API routers (and, through them, all models) and mount them on the app"""
+    from routers import auth, assessment, documents, quizzes
 
-# Add relationship back-references
-# User.documents = relationship("Document", back_populates="user")
-# Document.quizzes = relationship("Quiz", back_populates="document", cascade="all, delete-orphan")
+    # Include routers with proper prefixes
+    app.include_router(auth.router, tags=["auth"])
+    app.include_router(assessment.router, prefix="/api/assessment", tags=["assessment"])
+    app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
+    app.include_router(quizzes.router, prefix="/api/quizzes", tags=["quizzes"])
 
-# Create tables
-print("Creating database tables...")
-Base.metadata.create_all(bind=engine)
-print("Database tables created successfully!")
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan event handler for startup and shutdown"""
-    # Startup
-    print("\n🚀 AI Tutoring App Starting Up...")
-    print("=" * 50)
-    
-    # Show configuration
-    print(f"📁 Upload Directory: {settings.UPLOAD_DIRECTORY}")
-    print(f"🗄️  Database URL: {settings.DATABASE_URL}")
-    print(f"🤖 Hugging Face API Token: {'✓ Set' if os.getenv('HUGGINGFACEHUB_API_TOKEN') else '✗ Not Set'}")
-    
+def print_route_table(app: FastAPI):
+    """Print every API route grouped by tag (debug only, runs once per worker boot)"""
     print("\n📋 Registered API Routes:")
     routes_by_tag = {}
     for route in app.routes:
@@ -55,22 +46,109 @@ async def lifespan(app: FastAPI):
         print(f"\n  [{tag.upper()}]")
         for route in sorted(routes):
             print(route)
+
+def start_log_queue() -> QueueListener:
+    """Send log records through a queue; a listener thread does the blocking stream writes"""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root_logger = logging.getLogger()
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifespan event handler for startup and shutdown"""
+    # Startup
+    log_listener = start_log_queue()
+    print("\n🚀 AI Tutoring App Starting Up...")
+    print("=" * 50)
+    
+    # Routers are imported here rather than at module import to keep cold start cheap;
+    # this also registers every model with SQLAlchemy before create_all
+    register_routers(app)
+    
+    # Create tables
+    if settings.AUTO_CREATE_TABLES:
+        print("Creating database tables...")
+        Base.metadata.create_all(bind=engine)
+        # create_all() leaves existing tables alone; add columns introduced since
+        from migration_update_schema import add_missing_columns
+        add_missing_columns(engine)
+        print("Database tables created successfully!")
+    
+    # Create upload directories
+    upload_dirs = [
+        settings.UPLOAD_DIRECTORY,
+        os.path.join(settings.UPLOAD_DIRECTORY, "profiles"),
+        os.path.join(settings.UPLOAD_DIRECTORY, "documents"),
+    ]
+    
+    for directory in upload_dirs:
+        os.makedirs(directory, exist_ok=True)
+        print(f"Ensured directory exists: {directory}")
+    
+    # Static bodies for / and /health, built once per worker instead of per request
+    app.state.root_body = orjson.dumps({
+        "message": "AI Tutoring App API", 
+        "version": "1.0.0",
+        "status": "running",
+        "timestamp": time.time(),  # worker start time
+        "endpoints": {
+            "docs": "/docs",
+            "health": "/health",
+            "api": {
+                "auth": "/api/auth",
+                "documents": "/api/documents", 
+                "quizzes": "/api/quizzes",
+                "assessment": "/api/assessment"
+            }
+        }
+    })
+    app.state.upload_dir_status = "accessible" if os.path.isdir(settings.UPLOAD_DIRECTORY) else "missing"
+    
+    # Show configuration
+    print(f"📁 Upload Directory: {settings.UPLOAD_DIRECTORY}")
+    print(f"🗄️  Database URL: {settings.DATABASE_URL}")
+    print(f"🤖 Hugging Face API Token: {'✓ Set' if os.getenv('HUGGINGFACEHUB_API_TOKEN') else '✗ Not Set'}")
+    
+    if settings.DEBUG_STARTUP_LOG:
+        print_route_table(app)
+    else:
+        print(f"📋 Registered API Routes: {len(app.routes)}")
     
     print(f"\n🌍 Server available at: http://localhost:8000")
     print(f"📚 API Documentation: http://localhost:8000/docs")
     print(f"🧪 Test the API: http://localhost:8000/health")
     print("=" * 50)
     
+    # Queue workers for uploaded documents (Celery takes over when REDIS_URL is set)
+    from routers.documents import start_document_workers, stop_document_workers
+    document_workers = [] if settings.REDIS_URL else start_document_workers(
+        settings.DOCUMENT_WORKERS, settings.PDF_WORKERS
+    )
+    
     yield
     
-    # Shutdown (if needed)
+    # Shutdown
     print("🛑 Shutting down AI Tutoring App...")
+    await stop_document_workers(document_workers)
+    from services.llm_client import backend
+    await backend.close()
+    engine.dispose()
+    log_listener.stop()
 
 app = FastAPI(
     title="AI Tutoring App",
     description="AI-powered tutoring with adaptive quizzes",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS - Allow all origins in development
@@ -82,56 +160,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create upload directories
-upload_dirs = [
-    settings.UPLOAD_DIRECTORY,
-    os.path.join(settings.UPLOAD_DIRECTORY, "profiles"),
-    os.path.join(settings.UPLOAD_DIRECTORY, "documents"),
-]
-
-for directory in upload_dirs:
-    os.makedirs(directory, exist_ok=True)
-    print(f"Ensured directory exists: {directory}")
+# Compress large JSON bodies (quiz/document lists) for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
-# Static files
-app.mount("/static", StaticFiles(directory=settings.UPLOAD_DIRECTORY), name="static")
-
-# Include routers with proper prefixes
-app.include_router(auth.router, tags=["auth"])
-app.include_router(assessment.router, prefix="/api/assessment", tags=["assessment"])
-app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
-app.include_router(quizzes.router, prefix="/api/quizzes", tags=["quizzes"])
+# Static files (directory is created in lifespan, before the first request).
+# Only dev streams them through the app; in production nginx sends them with sendfile:
+#   location /internal/ { internal; alias /app/uploads/; sendfile on; tcp_nopush on; }
+if settings.ENV == "dev":
+    app.mount("/static", StaticFiles(directory=settings.UPLOAD_DIRECTORY, check_dir=False), name="static")
+else:
+    @app.get("/static/{file_path:path}", include_in_schema=False)
+    async def static_file(file_path: str):
+        """Hand the upload off to the proxy instead of pumping its bytes through the event loop"""
+        if ".." in file_path.split("/"):
+            raise HTTPException(status_code=404, detail="Not found")
+        return Response(headers={"X-Accel-Redirect": f"/internal/{quote(file_path)}"})
 
 @app.get("/")
 async def root():
     """API root endpoint"""
-    return {
-        "message": "AI Tutoring App API", 
-        "version": "1.0.0",
-        "status": "running",
-        "timestamp": time.time(),
-        "endpoints": {
-            "docs": "/docs",
-            "health": "/health",
-            "api": {
-                "auth": "/api/auth",
-                "documents": "/api/documents", 
-                "quizzes": "/api/quizzes",
-                "assessment": "/api/assessment"
-            }
-        }
-    }
+    return Response(content=app.state.root_body, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
+    return ORJSONResponse({
         "status": "healthy",
         "version": "1.0.0",
         "timestamp": time.time(),
         "database": "connected",
-        "upload_dir": "accessible" if os.path.exists(settings.UPLOAD_DIRECTORY) else "missing"
-    }
+        "upload_dir": app.state.upload_dir_status
+    })
 
 # Add a test endpoint to verify document processing
 @app.get("/api/test/status")
@@ -147,11 +206,14 @@ async def test_status():
         "timestamp": time.time()
     }
 
+# Development entry point only. Production runs under gunicorn with one
+# UvicornWorker per core (see render.yaml):
+#   gunicorn -k uvicorn.workers.UvicornWorker main:app --workers $(nproc)
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting AI Tutoring App server...")
     uvicorn.run(
-        app, 
+        "main:app",  # import string, required for reload
         host="0.0.0.0", 
         port=8000,
         reload=True,  # Enable auto-reload for development
@@ -4,187 +4,275 @@ Database migration to update schema for the fixed models
 Run this after updating your models to match the frontend expectations
 """
 
-from sqlalchemy import text
+from sqlalchemy import inspect
 from database import engine
+from models.document import Document
+from models.quiz import Question
+
+# All table/column changes are sent as a single script and run in one transaction:
+# either the whole schema update applies or none of it does. Steps that depend on
+# legacy columns/tables check information_schema first, so re-running is safe.
+SCHEMA_MIGRATION = """
+-- 1. documents table
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS original_name VARCHAR(255);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100) DEFAULT 'application/pdf';
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS page_count INTEGER;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content TEXT;  -- renamed from extracted_text
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS summary TEXT;  -- renamed from ai_summary
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS key_topics JSON;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS tags JSON;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+DO $$
+BEGIN
+    -- Copy data from the old columns (if they exist)
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'documents'
+                 AND column_name = 'extracted_text') THEN
+        UPDATE documents SET content = extracted_text
+        WHERE content IS NULL AND extracted_text IS NOT NULL;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'documents'
+                 AND column_name = 'ai_summary') THEN
+        UPDATE documents SET summary = ai_summary
+        WHERE summary IS NULL AND ai_summary IS NOT NULL;
+    END IF;
+
+    -- Update processing_status values (only when stored as plain strings)
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'documents'
+                 AND column_name = 'processing_status'
+                 AND data_type IN ('character varying', 'text')) THEN
+        UPDATE documents SET processing_status = 'processed'
+        WHERE processing_status = 'completed';
+    END IF;
+END $$;
+
+UPDATE documents SET original_name = filename WHERE original_name IS NULL;
+
+-- 2. quizzes, questions and quiz_submissions tables
+CREATE TABLE IF NOT EXISTS quizzes (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    difficulty VARCHAR(20) DEFAULT 'medium',
+    estimated_duration INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+DO $$
+BEGIN
+    -- Migrate data from the old single-table quiz schema, then drop it
+    IF EXISTS (SELECT 1 FROM information_schema.tables
+               WHERE table_schema = current_schema() AND table_name = 'quiz') THEN
+        INSERT INTO quizzes (document_id, title, description, created_at)
+        SELECT document_id,
+               COALESCE(question, 'Quiz') AS title,
+               'Migrated quiz' AS description,
+               CURRENT_TIMESTAMP
+        FROM quiz
+        WHERE NOT EXISTS (SELECT 1 FROM quizzes WHERE document_id = quiz.document_id);
+
+        DROP TABLE quiz CASCADE;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS questions (
+    id SERIAL PRIMARY KEY,
+    quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+    question_text TEXT NOT NULL,
+    question_type VARCHAR(20) DEFAULT 'multiple_choice',
+    options JSONB,
+    correct_answer VARCHAR(500) NOT NULL,
+    explanation TEXT,
+    order_index INTEGER DEFAULT 0
+);
+
+-- Normalized (trimmed, lowercased) correct answer, compared directly when scoring
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS correct_answer_normalized VARCHAR(500);
+UPDATE questions SET correct_answer_normalized = LOWER(TRIM(correct_answer))
+WHERE correct_answer_normalized IS NULL;
+
+CREATE TABLE IF NOT EXISTS quiz_submissions (
+    id SERIAL PRIMARY KEY,
+    quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    answers JSONB NOT NULL,
+    score INTEGER NOT NULL,
+    time_spent INTEGER,
+    completed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 3. JSON columns that are read back whole or filtered on: JSONB
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'questions'
+                 AND column_name = 'options' AND data_type = 'json') THEN
+        ALTER TABLE questions ALTER COLUMN options TYPE JSONB USING options::jsonb;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'quiz_submissions'
+                 AND column_name = 'answers' AND data_type = 'json') THEN
+        ALTER TABLE quiz_submissions ALTER COLUMN answers TYPE JSONB USING answers::jsonb;
+    END IF;
+END $$;
+
+-- 4. Enum columns: plain VARCHAR holding the enum values ('processed', 'medium', ...)
+DO $$
+BEGIN
+    -- Tables created by create_all() used native ENUM types holding the member names
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'documents'
+                 AND column_name = 'processing_status' AND data_type = 'USER-DEFINED') THEN
+        ALTER TABLE documents ALTER COLUMN processing_status TYPE VARCHAR(20)
+            USING processing_status::text;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'quizzes'
+                 AND column_name = 'difficulty' AND data_type = 'USER-DEFINED') THEN
+        ALTER TABLE quizzes ALTER COLUMN difficulty TYPE VARCHAR(20) USING difficulty::text;
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = current_schema() AND table_name = 'questions'
+                 AND column_name = 'question_type' AND data_type = 'USER-DEFINED') THEN
+        ALTER TABLE questions ALTER COLUMN question_type TYPE VARCHAR(20) USING question_type::text;
+    END IF;
+END $$;
+
+DROP TYPE IF EXISTS processingstatus;
+DROP TYPE IF EXISTS difficultylevel;
+DROP TYPE IF EXISTS questiontype;
+
+-- Map member names to values
+UPDATE documents SET processing_status = CASE processing_status
+        WHEN 'COMPLETED' THEN 'processed'
+        ELSE LOWER(processing_status)
+    END
+WHERE processing_status IN ('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED');
+
+UPDATE quizzes SET difficulty = LOWER(difficulty)
+WHERE difficulty IN ('EASY', 'MEDIUM', 'HARD');
+
+UPDATE questions SET question_type = LOWER(question_type)
+WHERE question_type IN ('MULTIPLE_CHOICE', 'TRUE_FALSE', 'SHORT_ANSWER');
+
+-- 5. Emails are stored lowercased; skip addresses that would collide with another account
+UPDATE users SET email = LOWER(email)
+WHERE email <> LOWER(email)
+  AND NOT EXISTS (SELECT 1 FROM users other
+                  WHERE LOWER(other.email) = LOWER(users.email) AND other.id <> users.id);
+"""
+
+# Built CONCURRENTLY so live tables stay writable; Postgres only allows that outside
+# a transaction block, so these run one by one in autocommit mode
+INDEX_MIGRATIONS = [
+    # Back the "latest row per user" queries (WHERE user_id = ? ORDER BY ... DESC)
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_learning_assessments_user_completed
+    ON learning_assessments (user_id, completed_at DESC);
+    """,
+
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_quiz_submissions_user_completed
+    ON quiz_submissions (user_id, completed_at DESC);
+    """,
+
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_user_uploaded
+    ON documents (user_id, uploaded_at DESC);
+    """,
+
+    # Lookup of an already processed document with identical text
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_content_hash
+    ON documents (content_hash);
+    """,
+
+    # Foreign keys followed by every quiz query (Postgres does not index them itself):
+    # a document's quizzes, and a quiz's questions in order
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_quizzes_document_id
+    ON quizzes (document_id);
+    """,
+
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_questions_quiz_order
+    ON questions (quiz_id, order_index);
+    """
+]
+
+# Columns added to existing tables since they were first created. create_all() only
+# creates missing tables and SCHEMA_MIGRATION is PostgreSQL-only, so these are also
+# added here, through SQLAlchemy, on every backend (MySQL, SQLite, ...), each with the
+# portable SQL that fills it in for existing rows, if any
+ADDED_COLUMNS = {
+    Document.__table__.c.content_hash: None,
+    # Normalized (trimmed, lowercased) correct answer, compared directly when scoring
+    Question.__table__.c.correct_answer_normalized: (
+        "UPDATE questions SET correct_answer_normalized = LOWER(TRIM(correct_answer)) "
+        "WHERE correct_answer_normalized IS NULL"
+    ),
+}
+
+def add_missing_columns(bind):
+    """Add ADDED_COLUMNS (with their indexes and backfills) to existing tables that lack them"""
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for column, backfill in ADDED_COLUMNS.items():
+            table = column.table
+            if not inspector.has_table(table.name):
+                continue  # create_all() builds it with the column
+            if column.name in {c["name"] for c in inspector.get_columns(table.name)}:
+                continue
+            conn.exec_driver_sql(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                f"{column.type.compile(dialect=conn.dialect)}"
+            )
+            for index in table.indexes:
+                if column.name in index.columns:
+                    index.create(conn)
+            if backfill:
+                conn.exec_driver_sql(backfill)
 
 def run_migration():
     """Run the database schema migration"""
-    with engine.connect() as conn:
-        try:
-            print("Starting database migration...")
-            
-            # Update documents table
-            print("1. Updating documents table...")
-            
-            # Add new columns if they don't exist
-            migration_queries = [
-                # Add original_name column
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS original_name VARCHAR(255);
-                """,
-                
-                # Add mime_type column  
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS mime_type VARCHAR(100) DEFAULT 'application/pdf';
-                """,
-                
-                # Add page_count column
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS page_count INTEGER;
-                """,
-                
-                # Rename extracted_text to content
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS content TEXT;
-                """,
-                
-                # Copy data from old column to new (if it exists)
-                """
-                UPDATE documents 
-                SET content = extracted_text 
-                WHERE content IS NULL AND extracted_text IS NOT NULL;
-                """,
-                
-                # Rename ai_summary to summary
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS summary TEXT;
-                """,
-                
-                # Copy data from old column to new (if it exists)
-                """
-                UPDATE documents 
-                SET summary = ai_summary 
-                WHERE summary IS NULL AND ai_summary IS NOT NULL;
-                """,
-                
-                # Add key_topics column as JSON
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS key_topics JSON;
-                """,
-                
-                # Add tags column as JSON
-                """
-                ALTER TABLE documents 
-                ADD COLUMN IF NOT EXISTS tags JSON;
-                """,
-                
-                # Update original_name from filename if null
-                """
-                UPDATE documents 
-                SET original_name = filename 
-                WHERE original_name IS NULL;
-                """,
-                
-                # Update processing_status enum values
-                """
-                UPDATE documents 
-                SET processing_status = 'processed' 
-                WHERE processing_status = 'completed';
-                """
-            ]
-            
-            for query in migration_queries:
-                try:
-                    conn.execute(text(query))
-                    conn.commit()
-                except Exception as e:
-                    print(f"Query failed (this might be normal): {str(e)}")
-                    conn.rollback()
-            
-            print("2. Updating quizzes table...")
-            
-            # Update quiz schema
-            quiz_migrations = [
-                # Create new quizzes table structure
-                """
-                CREATE TABLE IF NOT EXISTS quizzes_new (
-                    id SERIAL PRIMARY KEY,
-                    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    difficulty VARCHAR(20) DEFAULT 'medium',
-                    estimated_duration INTEGER,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """,
-                
-                # Create questions table
-                """
-                CREATE TABLE IF NOT EXISTS questions (
-                    id SERIAL PRIMARY KEY,
-                    quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
-                    question_text TEXT NOT NULL,
-                    question_type VARCHAR(20) DEFAULT 'multiple_choice',
-                    options JSON,
-                    correct_answer VARCHAR(500) NOT NULL,
-                    explanation TEXT,
-                    order_index INTEGER DEFAULT 0
-                );
-                """,
-                
-                # Create quiz_submissions table
-                """
-                CREATE TABLE IF NOT EXISTS quiz_submissions (
-                    id SERIAL PRIMARY KEY,
-                    quiz_id INTEGER NOT NULL REFERENCES quizzes(id) ON DELETE CASCADE,
-                    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                    answers JSON NOT NULL,
-                    score INTEGER NOT NULL,
-                    time_spent INTEGER,
-                    completed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                );
-                """,
-                
-                # Migrate data from old quiz table if it exists
-                """
-                INSERT INTO quizzes_new (document_id, title, description, created_at)
-                SELECT document_id, 
-                       COALESCE(question, 'Quiz') as title,
-                       'Migrated quiz' as description,
-                       CURRENT_TIMESTAMP
-                FROM quiz 
-                WHERE NOT EXISTS (SELECT 1 FROM quizzes_new WHERE document_id = quiz.document_id)
-                ON CONFLICT DO NOTHING;
-                """,
-                
-                # Drop old quiz table and rename new one
-                """
-                DROP TABLE IF EXISTS quiz CASCADE;
-                """,
-                
-                """
-                ALTER TABLE quizzes_new RENAME TO quizzes;
-                """
-            ]
-            
-            for query in quiz_migrations:
-                try:
-                    conn.execute(text(query))
-                    conn.commit()
-                except Exception as e:
-                    print(f"Quiz migration query failed: {str(e)}")
-                    conn.rollback()
-            
-            # Update relationships in Document model
-            print("3. Adding relationship back-references...")
-            
-            # These will be handled by SQLAlchemy relationships, no SQL needed
-            
-            print("Migration completed successfully!")
-            print("\nNext steps:")
-            print("1. Update your model files with the fixed versions")
-            print("2. Restart your FastAPI server")
-            print("3. Test document upload and quiz generation")
-            
-        except Exception as e:
-            print(f"Migration failed: {str(e)}")
-            raise
+    try:
+        print("Starting database migration...")
+
+        if engine.dialect.name == "postgresql":
+            print("1. Updating documents and quiz tables...")
+            with engine.begin() as conn:
+                conn.exec_driver_sql(SCHEMA_MIGRATION)
+
+            # Relationship back-references are handled by SQLAlchemy, no SQL needed
+
+            print("2. Adding composite indexes...")
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                for statement in INDEX_MIGRATIONS:
+                    conn.exec_driver_sql(statement)
+        else:
+            print(f"1-2. Skipping PostgreSQL-only steps on {engine.dialect.name}")
+
+        print("3. Adding new columns missing from existing tables...")
+        add_missing_columns(engine)
+
+        print("Migration completed successfully!")
+        print("\nNext steps:")
+        print("1. Update your model files with the fixed versions")
+        print("2. Restart your FastAPI server")
+        print("3. Test document upload and quiz generation")
+
+    except Exception as e:
+        print(f"Migration failed: {str(e)}")
+        raise
 
 if __name__ == "__main__":
-    run_migration()
\ No newline at end of file
+    run_migration()
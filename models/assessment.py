@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -16,4 +16,9 @@ class LearningAssessment(Base):
     reading_score = Column(Integer, default=0)
     completed_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Latest assessment per user: WHERE user_id = ? ORDER BY completed_at DESC LIMIT 1
+    __table_args__ = (
+        Index("ix_learning_assessments_user_completed", user_id, completed_at.desc()),
+    )
+    
     user = relationship("User", backref="assessments")
\ No newline at end of file
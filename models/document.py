@@ -1,10 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
 import enum
 
-class ProcessingStatus(enum.Enum):
+class ProcessingStatus(str, enum.Enum):
     PENDING = "pending"
     PROCESSING = "processing" 
     COMPLETED = "processed"  # Changed to match frontend expectation
@@ -22,30 +22,21 @@ class Document(Base):
     mime_type = Column(String(100), nullable=False, default="application/pdf")
     page_count = Column(Integer, nullable=True)
     content = Column(Text, nullable=True)  # Renamed from extracted_text
+    content_hash = Column(String(64), nullable=True, index=True)  # sha256 of content, for reusing LLM results
     summary = Column(Text, nullable=True)  # Renamed from ai_summary
     key_topics = Column(JSON, nullable=True)  # Add key topics as JSON array
     tags = Column(JSON, nullable=True)  # Add tags as JSON array
-    processing_status = Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
+    # Stored as the plain value string (VARCHAR), so rows read back without a name lookup
+    processing_status = Column(
+        Enum(ProcessingStatus, values_callable=lambda e: [m.value for m in e], native_enum=False),
+        default=ProcessingStatus.PENDING
+    )
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     processed_at = Column(DateTime(timezone=True), nullable=True)
     
+    __table_args__ = (
+        Index("ix_documents_user_uploaded", user_id, uploaded_at.desc()),
+    )
+    
     user = relationship("User", back_populates="documents")
     quizzes = relationship("Quiz", back_populates="document", cascade="all, delete-orphan")
-
-    def to_dict(self):
-        """Convert model to dictionary matching frontend expectations"""
-        return {
-            "id": str(self.id),
-            "name": self.filename,
-            "originalName": self.original_name,
-            "fileSize": self.file_size,
-            "mimeType": self.mime_type,
-            "status": self.processing_status.value,
-            "uploadDate": self.uploaded_at.isoformat() if self.uploaded_at else None,
-            "processedAt": self.processed_at.isoformat() if self.processed_at else None,
-            "summary": self.summary,
-            "content": self.content,
-            "pageCount": self.page_count,
-            "tags": self.tags or [],
-            "userId": str(self.user_id)
-        }
\ No newline at end of file
@@ -1,48 +1,47 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum, JSON, Index, select
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, column_property, validates
+from functools import cached_property
 from database import Base
 import enum
-import json
+import orjson
 
-class QuestionType(enum.Enum):
+# Binary JSONB on PostgreSQL (indexable, supports ? / @> operators); plain JSON elsewhere
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
+class QuestionType(str, enum.Enum):
     MULTIPLE_CHOICE = "multiple_choice"
     TRUE_FALSE = "true_false"
     SHORT_ANSWER = "short_answer"
 
-class DifficultyLevel(enum.Enum):
+class DifficultyLevel(str, enum.Enum):
     EASY = "easy"
     MEDIUM = "medium"
     HARD = "hard"
 
+def normalize_answer(answer: str) -> str:
+    """Form answers are compared in when scoring (case and surrounding whitespace ignored)"""
+    return answer.strip().lower()
+
 class Quiz(Base):
     __tablename__ = "quizzes"
     
     id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
-    difficulty = Column(Enum(DifficultyLevel), default=DifficultyLevel.MEDIUM)
+    difficulty = Column(
+        Enum(DifficultyLevel, values_callable=lambda e: [m.value for m in e], native_enum=False),
+        default=DifficultyLevel.MEDIUM
+    )
     estimated_duration = Column(Integer, nullable=True)  # in minutes
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Relationships
+    # Relationships - collections must be eager-loaded at the query site (e.g. selectinload)
     document = relationship("Document", back_populates="quizzes")
-    questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan")
-    submissions = relationship("QuizSubmission", back_populates="quiz", cascade="all, delete-orphan")
-
-    def to_dict(self):
-        return {
-            "id": str(self.id),
-            "title": self.title,
-            "description": self.description,
-            "documentId": str(self.document_id),
-            "difficulty": self.difficulty.value,
-            "totalQuestions": len(self.questions),
-            "estimatedDuration": self.estimated_duration or 10,
-            "createdAt": self.created_at.isoformat() if self.created_at else None,
-            "questions": [q.to_dict() for q in self.questions]
-        }
+    questions = relationship("Question", back_populates="quiz", cascade="all, delete-orphan", lazy="raise")
+    submissions = relationship("QuizSubmission", back_populates="quiz", cascade="all, delete-orphan", lazy="raise")
 
 class Question(Base):
     __tablename__ = "questions"
@@ -50,53 +49,93 @@ class Question(Base):
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
     question_text = Column(Text, nullable=False)
-    question_type = Column(Enum(QuestionType), default=QuestionType.MULTIPLE_CHOICE)
-    options = Column(JSON, nullable=True)  # Store as JSON for multiple choice
+    question_type = Column(
+        Enum(QuestionType, values_callable=lambda e: [m.value for m in e], native_enum=False),
+        default=QuestionType.MULTIPLE_CHOICE
+    )
+    options = Column(JSONDocument, nullable=True)  # Store as JSON for multiple choice
     correct_answer = Column(String(500), nullable=False)
+    correct_answer_normalized = Column(String(500), nullable=True)  # normalize_answer(correct_answer), set on insert
     explanation = Column(Text, nullable=True)
     order_index = Column(Integer, default=0)
     
+    __table_args__ = (
+        Index("ix_questions_quiz_order", quiz_id, order_index),
+    )
+    
     # Relationships
-    quiz = relationship("Quiz", back_populates="questions")
+    quiz = relationship("Quiz", back_populates="questions", lazy="raise")
+
+    @validates("correct_answer")
+    def validate_correct_answer(self, key, correct_answer):
+        """Keep the normalized copy in step for ORM writes (bulk inserts set it themselves)"""
+        self.correct_answer_normalized = normalize_answer(correct_answer)
+        self.__dict__.pop("_parsed_options", None)  # isCorrect flags depend on the answer
+        return correct_answer
 
-    def to_dict(self):
-        return {
-            "id": str(self.id),
-            "text": self.question_text,
-            "type": self.question_type.value,
-            "options": self.parse_options() if self.options else None,
-            "correctAnswer": self.correct_answer,
-            "explanation": self.explanation
-        }
+    @validates("options")
+    def validate_options(self, key, options):
+        """Decode JSON strings on write so reads never have to; options are a dict or a list"""
+        if isinstance(options, (str, bytes)):
+            try:
+                options = orjson.loads(options)
+            except orjson.JSONDecodeError:
+                raise ValueError("Question options are not valid JSON")
+        if options is not None and not isinstance(options, (dict, list)):
+            raise ValueError(f"Question options must be a dict or a list, not {type(options).__name__}")
+        # Drop the list built from the previous value
+        self.__dict__.pop("_parsed_options", None)
+        return options
+
+    @cached_property
+    def _parsed_options(self):
+        """Options list built once per instance (quiz replays serialize the same Question repeatedly)"""
+        return self.parse_options()
 
     def parse_options(self):
         """Parse options from JSON or string format"""
         if not self.options:
             return None
             
-        if isinstance(self.options, dict):
-            return [{"id": k, "text": v, "isCorrect": k == self.correct_answer} 
-                   for k, v in self.options.items()]
-        elif isinstance(self.options, str):
+        options_dict = self.options
+        if isinstance(options_dict, str):
+            # Rows written before options were normalized on write
             try:
-                options_dict = json.loads(self.options)
-                return [{"id": k, "text": v, "isCorrect": k == self.correct_answer} 
-                       for k, v in options_dict.items()]
-            except json.JSONDecodeError:
+                options_dict = orjson.loads(options_dict)
+            except orjson.JSONDecodeError:
                 return None
+        if isinstance(options_dict, dict):
+            return [{"id": k, "text": v, "isCorrect": k == self.correct_answer} 
+                   for k, v in options_dict.items()]
+        if isinstance(options_dict, list):
+            # Plain list of option texts: the text is the id the answer refers to
+            return [{"id": str(v), "text": v, "isCorrect": str(v) == self.correct_answer}
+                   for v in options_dict]
         return None
 
+# Question count computed in the quiz SELECT itself instead of len(quiz.questions)
+Quiz.question_count = column_property(
+    select(func.count(Question.id))
+    .where(Question.quiz_id == Quiz.id)
+    .correlate_except(Question)
+    .scalar_subquery()
+)
+
 class QuizSubmission(Base):
     __tablename__ = "quiz_submissions"
     
     id = Column(Integer, primary_key=True, index=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    answers = Column(JSON, nullable=False)  # Store user answers
+    answers = Column(JSONDocument, nullable=False)  # Store user answers
     score = Column(Integer, nullable=False)  # Score as percentage
     time_spent = Column(Integer, nullable=True)  # Time in seconds
     completed_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index("ix_quiz_submissions_user_completed", user_id, completed_at.desc()),
+    )
+    
     # Relationships - FIXED: Removed problematic document relationship
     quiz = relationship("Quiz", back_populates="submissions")
     user = relationship("User", back_populates="quiz_submissions")
@@ -104,15 +143,4 @@ class QuizSubmission(Base):
     # Property to access document through quiz
     @property
     def document(self):
-        return self.quiz.document if self.quiz else None
-
-    def to_dict(self):
-        return {
-            "id": str(self.id),
-            "quizId": str(self.quiz_id),
-            "userId": str(self.user_id),
-            "answers": self.answers,
-            "score": self.score,
-            "timeSpent": self.time_spent,
-            "completedAt": self.completed_at.isoformat() if self.completed_at else None
-        }
\ No newline at end of file
+        return self.quiz.document if self.quiz else None
\ No newline at end of file
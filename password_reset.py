@@ -4,11 +4,17 @@ from database import SessionLocal
 from models.document import Document  # <-- Import so SQLAlchemy can resolve relationships
 
 
-db = SessionLocal()
-user = db.query(User).filter(User.id == 1).first()
-if user:
-    user.password_hash = get_password_hash("spizzoH23.")
-    db.commit()
-    print("Password reset successfully")
-else:
-    print("User not found")
\ No newline at end of file
+def reset_password(user_id: int, new_password: str):
+    """Set a new password for a user; the session is opened only while it is needed"""
+    with SessionLocal() as db:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user:
+            user.password_hash = get_password_hash(new_password)
+            db.commit()
+            print("Password reset successfully")
+        else:
+            print("User not found")
+
+
+if __name__ == "__main__":
+    reset_password(1, "spizzoH23.")
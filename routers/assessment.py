@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from database import get_db
 from schemas.assessment import AssessmentQuestion, AssessmentSubmission, AssessmentResult
-from services.assessment_service import AssessmentService
+from services.assessment_service import AssessmentService, ASSESSMENT_QUESTIONS_JSON
 from dependencies import get_current_active_user
 from models.user import User
 from models.assessment import LearningAssessment
@@ -12,10 +12,10 @@ router = APIRouter(prefix="/api/assessment", tags=["assessment"])
 
 @router.get("/questions", response_model=List[AssessmentQuestion])
 async def get_assessment_questions():
-    return AssessmentService.get_assessment_questions()
+    return Response(content=ASSESSMENT_QUESTIONS_JSON, media_type="application/json")
 
 @router.post("/submit", response_model=AssessmentResult)
-async def submit_assessment(
+def submit_assessment(
     submission: AssessmentSubmission,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -24,7 +24,7 @@ async def submit_assessment(
     return assessment
 
 @router.get("/result", response_model=AssessmentResult)
-async def get_assessment_result(
+def get_assessment_result(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -2,6 +2,7 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from database import get_db
 from schemas.user import UserCreate, UserResponse, UserUpdate, Token
@@ -10,7 +11,7 @@ from utils.security import create_access_token, create_refresh_token
 from dependencies import get_current_active_user
 from models.user import User
 from utils.file_handler import save_file
-from config import settings
+from config import Settings, get_settings
 import os
 from datetime import timedelta
 from pydantic import BaseModel
@@ -23,12 +24,16 @@ class LoginRequest(BaseModel):
     password: str
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return AuthService.create_user(db, user_data)
 
 # Updated login endpoint to accept JSON
 @router.post("/login")
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):  # Changed LoginSchema to LoginRequest
+def login(
+    login_data: LoginRequest,
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings)
+):
     user = AuthService.authenticate_user(db, login_data.email, login_data.password)
     
     # Check if authentication failed
@@ -49,7 +54,11 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):  # Cha
 
 # Alternative: Keep OAuth2 form login for compatibility but add JSON endpoint
 @router.post("/login/oauth2")
-async def login_oauth2(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_oauth2(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings)
+):
     """OAuth2 compatible login endpoint for form data"""
     user = AuthService.authenticate_user(db, form_data.username, form_data.password)
     
@@ -72,23 +81,31 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
     return current_user
 
 @router.put("/profile", response_model=UserResponse)
-async def update_profile(
+def update_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    for field, value in user_update.dict(exclude_unset=True).items():
-        setattr(current_user, field, value)
+    payload = user_update.dict(exclude_unset=True)
+    if payload:
+        # Single UPDATE; "evaluate" applies the new values to current_user in Python,
+        # so no refresh SELECT is needed afterwards
+        db.execute(
+            update(User)
+            .where(User.id == current_user.id)
+            .values(**payload)
+            .execution_options(synchronize_session="evaluate")
+        )
+        db.commit()
     
-    db.commit()
-    db.refresh(current_user)
     return current_user
 
 @router.post("/upload-photo")
 async def upload_profile_photo(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     if not file.content_type.startswith("image/"):
         raise HTTPException(
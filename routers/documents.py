@@ -1,249 +1,304 @@
 import os
-import json
-import re
+import logging
 import asyncio
-import shutil
+import hashlib
 import time
+import multiprocessing
+import aiofiles
+import orjson
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from fastapi import HTTPException, APIRouter, UploadFile, File, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, APIRouter, UploadFile, File, Depends
+from sqlalchemy.orm import Session, contains_eager, selectinload
+from sqlalchemy import insert
 from sqlalchemy.sql import func
-from openai import AsyncOpenAI
-from huggingface_hub import AsyncInferenceClient
 from dotenv import load_dotenv
-from PyPDF2 import PdfReader
 
 from database import SessionLocal, get_db
 from models.document import Document, ProcessingStatus
-from models.quiz import Quiz
+from models.quiz import Quiz, Question, QuestionType, DifficultyLevel, normalize_answer
+from schemas.document import DocumentOut
 from dependencies import get_current_active_user
 from config import settings
+from utils.tokens import prepare_llm_input
+from services.llm_client import (
+    generate_text, json_grammar, DOCUMENT_ANALYSIS_SCHEMA
+)
+from services.cache import cache_delete, user_quizzes_key
 
 # Load environment variables from .env file
 load_dotenv()
 
-print("Documents router loading...")
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = AsyncInferenceClient(token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+# Token budget for document text in prompts (model context is 32k; leaves room for output)
+LLM_INPUT_TOKENS = 3500
 
 
 class DocumentService:
     @staticmethod
     async def process_document(document_id: int):
         """Background task: extract text, generate summary, topics, and quiz for a document."""
-        db = SessionLocal()
-        try:
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if not document:
-                print(f"Document {document_id} not found")
-                return
+        # Runs on the app's event loop: the blocking DB/PDF stages go to worker threads,
+        # only the LLM call is awaited here
+        prepared = await asyncio.to_thread(DocumentService.prepare_document, document_id)
+        if prepared is None:
+            return
+        text_content, analysis = prepared
 
-            # Update status to processing
-            document.processing_status = ProcessingStatus.PROCESSING
-            db.commit()
+        # Re-uploads of the same text reuse the earlier results instead of calling the LLM;
+        # otherwise generate summary, topics and quiz in one LLM call
+        if analysis is None:
+            analysis = await DocumentService.generate_analysis(text_content)
 
-            # Extract text from PDF
-            text_content = DocumentService.extract_pdf_text(document.file_path)
-            if not text_content:
-                raise Exception("Failed to extract text from PDF")
+        await asyncio.to_thread(DocumentService.save_analysis, document_id, analysis)
 
-            document.content = text_content
-            document.page_count = DocumentService.get_pdf_page_count(document.file_path)
-            db.commit()
+    @staticmethod
+    def save_new_document(db: Session, document: Document):
+        """Insert an uploaded document, loading server defaults (id, uploaded_at)"""
+        db.add(document)
+        db.commit()
+        db.refresh(document)
 
-            # Generate summary + topics
-            summary, key_topics = await DocumentService.generate_summary_and_topics(text_content)
+    @staticmethod
+    def prepare_document(document_id: int) -> Optional[Tuple[str, Optional[dict]]]:
+        """Mark the document as processing and extract its text; returns (text, cached analysis)"""
+        with SessionLocal() as db:
+            try:
+                document = db.query(Document).filter(Document.id == document_id).first()
+                if not document:
+                    logger.warning("Document %s not found", document_id)
+                    return None
 
-            # Generate quiz
-            quiz_questions = await DocumentService.generate_quiz_questions(text_content)
+                # Update status to processing
+                document.processing_status = ProcessingStatus.PROCESSING
+                db.commit()
 
-            # Save back to DB
-            document.summary = summary
-            document.key_topics = key_topics
-            document.processing_status = ProcessingStatus.COMPLETED
-            document.processed_at = func.now()
-            
-            print(f"Generated {len(quiz_questions)} quiz questions")
-            for q in quiz_questions:
-                quiz = Quiz(
-                    document_id=document.id,
-                    question=q["question"],
-                    options=json.dumps(q["options"]) if q.get("options") else None,
-                    correct_answer=q["answer"],
-                    explanation=q.get("explanation", "")
-                )
-                db.add(quiz)
+                # Extract text and page count from PDF (one open/parse)
+                if pdf_pool is not None:
+                    text_content, page_count = pdf_pool.submit(DocumentService.extract_pdf, document.file_path).result()
+                else:
+                    text_content, page_count = DocumentService.extract_pdf(document.file_path)
+                if not text_content:
+                    raise Exception("Failed to extract text from PDF")
 
-            db.commit()
-            db.refresh(document)
-            print(f"Document {document_id} processing completed")
+                document.content = text_content
+                document.page_count = page_count
+                document.content_hash = hashlib.sha256(text_content.encode()).hexdigest()
+                db.commit()
+
+                return text_content, DocumentService.cached_analysis(db, document)
+
+            except Exception as e:
+                DocumentService.mark_failed(db, document_id, e)
+                return None
+
+    @staticmethod
+    def save_analysis(document_id: int, analysis: dict):
+        """Store summary and topics, create the document's quiz and mark it processed"""
+        with SessionLocal() as db:
+            try:
+                document = db.query(Document).filter(Document.id == document_id).one()
+                quiz_questions = analysis["questions"]
+
+                # Save back to DB
+                document.summary = analysis["summary"]
+                document.key_topics = analysis["key_topics"]
+                document.processing_status = ProcessingStatus.COMPLETED
+                document.processed_at = func.now()
+                
+                logger.info("Generated %d quiz questions for document %s", len(quiz_questions), document_id)
+                if quiz_questions:
+                    quiz = Quiz(
+                        document_id=document.id,
+                        title=f"Quiz: {document.filename[:50]}{'...' if len(document.filename) > 50 else ''}",
+                        description=f"Auto-generated quiz from {document.filename}",
+                        difficulty=DifficultyLevel.MEDIUM,
+                        estimated_duration=max(5, len(quiz_questions) * 2)
+                    )
+                    db.add(quiz)
+                    db.flush()  # assigns quiz.id
+
+                    # One multi-row INSERT for all questions instead of one per row
+                    db.execute(insert(Question), [
+                        {
+                            "quiz_id": quiz.id,
+                            "question_text": q["question"],
+                            "question_type": QuestionType.MULTIPLE_CHOICE,
+                            "options": q.get("options") or None,
+                            "correct_answer": q["answer"],
+                            "correct_answer_normalized": normalize_answer(q["answer"]),
+                            "explanation": q.get("explanation", ""),
+                            "order_index": i
+                        }
+                        for i, q in enumerate(quiz_questions)
+                    ])
 
-        except Exception as e:
-            db.rollback()
-            # Update status to failed
-            document = db.query(Document).filter(Document.id == document_id).first()
-            if document:
-                document.processing_status = ProcessingStatus.FAILED
                 db.commit()
-            print(f"Error in process_document {document_id}: {str(e)}")
-        finally:
-            db.close()
+                if quiz_questions:
+                    cache_delete(user_quizzes_key(document.user_id))
+                logger.info("Document %s processing completed", document_id)
+
+            except Exception as e:
+                DocumentService.mark_failed(db, document_id, e)
 
     @staticmethod
-    def extract_pdf_text(file_path: str) -> str:
-        """Extract text content from PDF file"""
-        try:
-            with open(file_path, 'rb') as file:
-                reader = PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
-        except Exception as e:
-            print(f"Error extracting PDF text: {e}")
-            return ""
+    def mark_failed(db: Session, document_id: int, error: Exception):
+        """Roll back the failed step and set the document status to failed"""
+        db.rollback()
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document:
+            document.processing_status = ProcessingStatus.FAILED
+            db.commit()
+        logger.error("Error in process_document %s: %s", document_id, error, exc_info=error)
 
     @staticmethod
-    def get_pdf_page_count(file_path: str) -> int:
-        """Get number of pages in PDF"""
+    def extract_pdf(file_path: str) -> Tuple[str, int]:
+        """Extract text content and page count from a PDF file in a single pass"""
+        import pypdfium2 as pdfium
+
         try:
-            with open(file_path, 'rb') as file:
-                reader = PdfReader(file)
-                return len(reader.pages)
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                parts = []
+                for page in pdf:
+                    textpage = page.get_textpage()
+                    parts.append(textpage.get_text_range())
+                    # Free the native page buffers as we go instead of at GC time
+                    textpage.close()
+                    page.close()
+                return "\n".join(parts).strip(), len(parts)
+            finally:
+                pdf.close()
         except Exception as e:
-            print(f"Error getting PDF page count: {e}")
-            return 0
+            logger.warning("Error extracting PDF text from %s: %s", file_path, e)
+            return "", 0
+
+    @staticmethod
+    def cached_analysis(db: Session, document: Document) -> Optional[dict]:
+        """Analysis of an earlier processed document with the same content hash, if any"""
+        # Only documents whose analysis produced a quiz count; failed generations have none
+        quiz = db.query(Quiz).join(Quiz.document).options(
+            contains_eager(Quiz.document), selectinload(Quiz.questions)
+        ).filter(
+            Document.content_hash == document.content_hash,
+            Document.id != document.id,
+            Document.processing_status == ProcessingStatus.COMPLETED
+        ).order_by(Quiz.id).first()
+        if not quiz:
+            return None
+
+        logger.info("Reusing analysis of document %s for document %s", quiz.document_id, document.id)
+        return {
+            "summary": quiz.document.summary,
+            "key_topics": quiz.document.key_topics or [],
+            "questions": [
+                {
+                    "question": q.question_text,
+                    "options": q.options,
+                    "answer": q.correct_answer,
+                    "explanation": q.explanation
+                }
+                for q in sorted(quiz.questions, key=lambda q: q.order_index)
+            ]
+        }
 
     @staticmethod
-    async def generate_summary_and_topics(text: str):
+    async def generate_analysis(text: str) -> dict:
+        """Summary, key topics and quiz questions for a document from a single LLM call"""
         prompt = f"""
         Analyze the following educational text and provide:
         1. A concise summary (2-3 paragraphs)
-        2. Key topics covered as a JSON array
-
-        Format your response as:
-        SUMMARY:
-        [Your summary here]
+        2. Key topics covered
+        3. 5 multiple choice quiz questions based on the text
 
-        KEY_TOPICS:
-        ["topic1", "topic2", "topic3"]
+        Return a JSON object with the keys "summary", "key_topics" and "questions".
+        Each question has "question", "options" (keys "A" to "D"), "answer" (the
+        correct option key) and "explanation".
 
         Text:
-        {text[:4000]}
+        {prepare_llm_input(text, LLM_INPUT_TOKENS)}
         """
 
         try:
-            response = await client.text_generation(
+            response = await generate_text(
                 prompt=prompt,
                 model="mistralai/Mistral-7B-Instruct-v0.2",
-                max_new_tokens=800,
+                max_new_tokens=2000,
                 temperature=0.3,
+                grammar=json_grammar(DOCUMENT_ANALYSIS_SCHEMA),
             )
 
-            content = response
-            
-            summary = ""
-            key_topics = []
-            
-            try:
-                if "SUMMARY:" in content and "KEY_TOPICS:" in content:
-                    parts = content.split("KEY_TOPICS:")
-                    summary = parts[0].replace("SUMMARY:", "").strip()
-                    
-                    # Extract JSON array from topics section
-                    topics_text = parts[1].strip()
-                    topics_match = re.search(r'\[(.*?)\]', topics_text, re.DOTALL)
-                    if topics_match:
-                        topics_json = f"[{topics_match.group(1)}]"
-                        key_topics = json.loads(topics_json)
-                else:
-                    summary = content.strip()
-            except Exception as parse_error:
-                print(f"Error parsing AI response: {parse_error}")
-                summary = content.strip()
+            data = orjson.loads(response)
+            return {
+                "summary": data["summary"].strip(),
+                "key_topics": data["key_topics"],
+                "questions": data["questions"],
+            }
 
-            return summary, key_topics
-        
-        except Exception as e:
-            print(f"Error generating summary: {e}")
-            return "Summary generation failed", []
+        except Exception:
+            logger.exception("Error generating document analysis")
+            return {"summary": "Summary generation failed", "key_topics": [], "questions": []}
 
-    @staticmethod
-    async def generate_quiz_questions(text: str):
-        prompt = f"""
-        Create 5 multiple choice quiz questions based on this text. 
-        Return the output in **valid JSON** format only.
-        JSON format:
-        [
-          {{
-            "question": "string",
-            "options": {{"A": "option1", "B": "option2", "C": "option3", "D": "option4"}},
-            "answer": "A",
-            "explanation": "Brief explanation why this is correct"
-          }}
-        ]
 
-        Text:
-        {text[:3000]}
-        """
+# In-process processing queue (used when Celery is not configured), drained by a fixed
+# pool of workers started from the app lifespan
+document_queue: "asyncio.Queue[int]" = asyncio.Queue()
 
-        try:
-            response = await client.text_generation(
-                prompt=prompt,
-                model="koshkosh/quiz-generator",  # Using quiz generator model :cite[1]:cite[9]
-                max_new_tokens=1200,
-                temperature=0.5,
-            )
+# PDF text extraction for the queue workers runs in separate processes: it is CPU-bound,
+# and PDFium is not thread-safe, so concurrent worker threads must not call it directly.
+# Celery workers extract in their own (prefork) processes and leave this unset.
+pdf_pool: Optional[ProcessPoolExecutor] = None
 
-            raw_output = response.strip()
 
-            # Clean up common JSON formatting issues
-            raw_output = re.sub(r'^```json\s*', '', raw_output)
-            raw_output = re.sub(r'\s*```$', '', raw_output)
+async def document_worker():
+    """Process queued documents one at a time until cancelled"""
+    while True:
+        document_id = await document_queue.get()
+        try:
+            await DocumentService.process_document(document_id)
+        except Exception:
+            logger.exception("Unhandled error processing document %s", document_id)
+        finally:
+            document_queue.task_done()
 
-            try:
-                # Direct JSON parse
-                return json.loads(raw_output)
-            except json.JSONDecodeError:
-                # Try to extract JSON with regex
-                match = re.search(r'\[.*\]', raw_output, re.DOTALL)
-                if match:
-                    try:
-                        return json.loads(match.group(0))
-                    except Exception:
-                        pass
-                print(f"Raw AI output (invalid JSON): {raw_output}")
-                return []
-                
-        except Exception as e:
-            print(f"Error generating quiz: {e}")
-            return []
 
+def start_document_workers(count: int, pdf_processes: int) -> List[asyncio.Task]:
+    """Spawn `count` queue workers on the running event loop, and the PDF process pool"""
+    global pdf_pool
+    # spawn, not fork: the app process already runs threads (logging, threadpool)
+    pdf_pool = ProcessPoolExecutor(max_workers=pdf_processes, mp_context=multiprocessing.get_context("spawn"))
+    return [asyncio.create_task(document_worker()) for _ in range(count)]
 
-# Background task wrapper
-def process_document_background(document_id: int):
-    try:
-        asyncio.run(DocumentService.process_document(document_id))
-    except RuntimeError:
-        loop = asyncio.get_event_loop()
-        loop.create_task(DocumentService.process_document(document_id))
+
+async def stop_document_workers(workers: List[asyncio.Task]):
+    """Cancel the queue workers and shut down the PDF process pool"""
+    global pdf_pool
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    if pdf_pool is not None:
+        pdf_pool.shutdown(cancel_futures=True)
+        pdf_pool = None
 
 
 # Create router instance
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PDF_MAGIC = b"%PDF-"
+
 
-@router.post("/upload")
+@router.post("/upload", response_model=DocumentOut, status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
 ):
     """Upload a document for processing."""
     try:
-        print(f"Received file upload: {file.filename}")
+        logger.info("Received file upload: %s", file.filename)
         
         # Validate file type
         if not file.content_type == "application/pdf":
@@ -257,12 +312,24 @@ async def upload_document(
         # Ensure directory exists
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # The content type is client-controlled; check the PDF signature before writing anything
+        head = await file.read(len(PDF_MAGIC))
+        if head != PDF_MAGIC:
+            raise HTTPException(status_code=400, detail="File is not a valid PDF")
         
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        # Stream file to disk in 1MB chunks without blocking the event loop,
+        # counting the size as we go and stopping as soon as it exceeds the limit
+        file_size = len(head)
+        async with aiofiles.open(file_path, "wb") as buffer:
+            await buffer.write(head)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB limit"
+                    )
+                await buffer.write(chunk)
         
         # Create document record
         document = Document(
@@ -274,21 +341,28 @@ async def upload_document(
             mime_type=file.content_type,
             processing_status=ProcessingStatus.PENDING
         )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
+        # The insert is blocking I/O; keep it off the event loop
+        await asyncio.to_thread(DocumentService.save_new_document, db, document)
         
-        print(f"Created document with ID: {document.id}")
+        logger.info("Created document id=%s", document.id)
         
-        # Add background task
-        background_tasks.add_task(process_document_background, document.id)
+        if settings.REDIS_URL:
+            # Queue on the Celery broker; a separate worker pool does the processing
+            from worker import process_document
+            process_document.delay(document.id)
+        else:
+            # Picked up by one of the in-process workers on the app's event loop
+            document_queue.put_nowait(document.id)
         
-        return document.to_dict()
+        return document
         
     except HTTPException:
+        # Drop a partially written (oversized) file
+        if 'file_path' in locals() and os.path.exists(file_path):
+            os.remove(file_path)
         raise
     except Exception as e:
-        print(f"Error in upload_document: {str(e)}")
+        logger.exception("Error in upload_document")
         db.rollback()
         # Clean up file if it was created
         if 'file_path' in locals() and os.path.exists(file_path):
@@ -296,22 +370,22 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
-@router.get("/")
-async def get_documents(
+@router.get("/", response_model=List[DocumentOut])
+def get_documents(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Get all documents for the current user."""
     try:
         documents = db.query(Document).filter(Document.user_id == current_user.id).all()
-        return [doc.to_dict() for doc in documents]
-    except Exception as e:
-        print(f"Error getting documents: {str(e)}")
+        return documents
+    except Exception:
+        logger.exception("Error getting documents")
         raise HTTPException(status_code=500, detail="Failed to retrieve documents")
 
 
-@router.get("/{document_id}")
-async def get_document(
+@router.get("/{document_id}", response_model=DocumentOut)
+def get_document(
     document_id: int, 
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
@@ -324,17 +398,17 @@ async def get_document(
         ).first()
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
-        return document.to_dict()
+        return document
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting document {document_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error getting document %s", document_id)
         raise HTTPException(status_code=500, detail="Failed to retrieve document")
 
 
 # In your documents router, update the status endpoint
 @router.get("/{document_id}/status")
-async def get_document_status(
+def get_document_status(
     document_id: int, 
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
@@ -349,18 +423,18 @@ async def get_document_status(
             raise HTTPException(status_code=404, detail="Document not found")
         
         return {
-            "status": document.processing_status.value,
+            "status": document.processing_status,
             "processing_complete": document.processing_status == ProcessingStatus.COMPLETED,
             "processed_at": document.processed_at.isoformat() if document.processed_at else None
         }
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting document status {document_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error getting document status %s", document_id)
         raise HTTPException(status_code=500, detail="Failed to retrieve document status")
     
 @router.delete("/{document_id}")
-async def delete_document(
+def delete_document(
     document_id: int, 
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
@@ -384,18 +458,19 @@ async def delete_document(
         # Delete document record
         db.delete(document)
         db.commit()
+        cache_delete(user_quizzes_key(current_user.id))
         
         return {"message": "Document deleted successfully"}
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error deleting document {document_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error deleting document %s", document_id)
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete document")
 
 
 @router.get("/{document_id}/summary")
-async def get_document_summary(
+def get_document_summary(
     document_id: int, 
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
@@ -423,9 +498,6 @@ async def get_document_summary(
         }
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting summary for document {document_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error getting summary for document %s", document_id)
         raise HTTPException(status_code=500, detail="Failed to retrieve summary")
-
-
-print("Documents router loaded successfully")
\ No newline at end of file
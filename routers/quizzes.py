@@ -1,25 +1,52 @@
-import os
-import json
+import asyncio
+import logging
 from typing import List, Optional
-from fastapi import HTTPException, APIRouter, Depends
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from huggingface_hub import AsyncInferenceClient
+from fastapi import HTTPException, APIRouter, Depends, Response
+from sqlalchemy import and_, insert
+from sqlalchemy.orm import Session, selectinload, load_only
+from pydantic import BaseModel, TypeAdapter
 # from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 from database import get_db
-from models.document import Document
-from models.quiz import Quiz, Question, QuizSubmission, DifficultyLevel, QuestionType
+from models.document import Document, ProcessingStatus
+from models.quiz import Quiz, Question, QuizSubmission, DifficultyLevel, QuestionType, normalize_answer
+from schemas.quiz import QuizOut, QuizSubmissionOut
 from dependencies import get_current_active_user
+from contextlib import aclosing
+from utils.tokens import prepare_llm_input
+from utils.json_stream import JSONArrayItemScanner
+from services.llm_client import stream_text, json_grammar, QUIZ_QUESTIONS_SCHEMA
+from services.cache import cache_get_or_set, cache_delete, user_quizzes_key
 
 # Load environment variables
 load_dotenv()
 
-print("Quizzes router loading...")
+logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = AsyncInferenceClient(token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+# Token budget for document text in prompts
+LLM_INPUT_TOKENS = 3500
+
+# Invariant part of the quiz prompt, kept first so providers with prefix caching
+# can reuse it; only the count, difficulty and content follow
+QUIZ_PROMPT_INSTRUCTIONS = """You write multiple choice quiz questions from educational content.
+
+Return a JSON object with a "questions" array. Each question has "question"
+(clear, specific question text), "options" (keys "A" to "D"), "answer" (the
+correct option key) and "explanation" (why this answer is correct).
+
+Guidelines:
+- Make questions specific and test understanding, not just memorization
+- Ensure all options are plausible
+- Vary question types (definition, application, analysis)
+- Keep questions concise but comprehensive
+"""
+
+DIFFICULTY_PROMPTS = {
+    "easy": "Focus on basic comprehension and recall questions.",
+    "medium": "Create questions requiring understanding and application of concepts.",
+    "hard": "Generate questions requiring critical thinking, analysis, and synthesis."
+}
 
 # Pydantic models
 class QuizGenerateRequest(BaseModel):
@@ -36,12 +63,20 @@ class QuizSubmissionRequest(BaseModel):
 
 class QuizService:
     @staticmethod
-    async def generate_quiz_from_document(document: Document, difficulty: str = "medium", question_count: int = 10):
-        """Generate a quiz from document content using AI"""
+    async def generate_quiz_from_document(db: Session, document: Document, difficulty: str = "medium", question_count: int = 10):
+        """Generate a quiz from document content using AI and add it to the session (caller commits)"""
         if not document.content:
             raise HTTPException(status_code=400, detail="Document content not available")
 
         try:
+            # Generate questions using Hugging Face AI
+            questions_data = await QuizService._generate_questions_ai(
+                document.content, difficulty, question_count
+            )
+            
+            if not questions_data:
+                raise HTTPException(status_code=500, detail="Failed to generate quiz questions")
+            
             # Create quiz record first
             quiz_title = f"Quiz: {document.filename[:50]}{'...' if len(document.filename) > 50 else ''}"
             quiz = Quiz(
@@ -51,100 +86,61 @@ class QuizService:
                 difficulty=DifficultyLevel(difficulty),
                 estimated_duration=max(5, question_count * 2)  # 2 minutes per question minimum
             )
+            db.add(quiz)
+            db.flush()  # assigns quiz.id
             
-            # Generate questions using Hugging Face AI
-            questions_data = await QuizService._generate_questions_ai(
-                document.content, difficulty, question_count
-            )
-            
-            if not questions_data:
-                raise HTTPException(status_code=500, detail="Failed to generate quiz questions")
-            
-            # Create question records
-            questions = []
-            for i, q_data in enumerate(questions_data):
-                question = Question(
-                    question_text=q_data.get("question", ""),
-                    question_type=QuestionType.MULTIPLE_CHOICE,
-                    options=q_data.get("options", {}),
-                    correct_answer=q_data.get("answer", ""),
-                    explanation=q_data.get("explanation", ""),
-                    order_index=i
-                )
-                questions.append(question)
-            
-            quiz.questions = questions
+            # Insert all question records with one multi-row INSERT
+            db.execute(insert(Question), [
+                {
+                    "quiz_id": quiz.id,
+                    "question_text": q_data.get("question", ""),
+                    "question_type": QuestionType.MULTIPLE_CHOICE,
+                    "options": q_data.get("options", {}),
+                    "correct_answer": q_data.get("answer", ""),
+                    "correct_answer_normalized": normalize_answer(q_data.get("answer", "")),
+                    "explanation": q_data.get("explanation", ""),
+                    "order_index": i
+                }
+                for i, q_data in enumerate(questions_data)
+            ])
             return quiz
             
+        except HTTPException:
+            raise
         except Exception as e:
-            print(f"Error generating quiz: {e}")
+            logger.exception("Error generating quiz")
             raise HTTPException(status_code=500, detail=f"Quiz generation failed: {str(e)}")
 
     @staticmethod
     async def _generate_questions_ai(content: str, difficulty: str, count: int) -> List[dict]:
         """Generate questions using Hugging Face AI"""
-        difficulty_prompts = {
-            "easy": "Focus on basic comprehension and recall questions.",
-            "medium": "Create questions requiring understanding and application of concepts.",
-            "hard": "Generate questions requiring critical thinking, analysis, and synthesis."
-        }
-        
-        prompt = f"""
-        Generate {count} multiple choice quiz questions from the following content.
-        Difficulty level: {difficulty} - {difficulty_prompts.get(difficulty, "")}
-        
-        Return a valid JSON array with this exact format:
-        [
-          {{
-            "question": "Clear, specific question text?",
-            "options": {{"A": "Option 1", "B": "Option 2", "C": "Option 3", "D": "Option 4"}},
-            "answer": "A",
-            "explanation": "Brief explanation of why this answer is correct"
-          }}
-        ]
-        
-        Guidelines:
-        - Make questions specific and test understanding, not just memorization
-        - Ensure all options are plausible
-        - Vary question types (definition, application, analysis)
-        - Keep questions concise but comprehensive
-        
-        Content:
-        {content[:4000]}
-        """
+        prompt = (
+            f"{QUIZ_PROMPT_INSTRUCTIONS}\n"
+            f"Generate {count} questions. Difficulty level: {difficulty} - {DIFFICULTY_PROMPTS.get(difficulty, '')}\n\n"
+            f"Content:\n{prepare_llm_input(content, LLM_INPUT_TOKENS)}\n"
+        )
 
+        # Questions are parsed as they stream in: generation stops as soon as `count` are
+        # complete, and output cut off by max_new_tokens still yields its finished questions
+        questions = []
+        scanner = JSONArrayItemScanner()
         try:
-            response = await client.text_generation(
+            async with aclosing(stream_text(
                 prompt=prompt,
                 model="koshkosh/quiz-generator",  # Using quiz generator model :cite[1]:cite[9]
                 max_new_tokens=2000,
-                temperature=0.7
-            )
+                temperature=0.7,
+                grammar=json_grammar(QUIZ_QUESTIONS_SCHEMA)
+            )) as chunks:
+                async for chunk in chunks:
+                    questions.extend(scanner.feed(chunk))
+                    if len(questions) >= count:
+                        break
 
-            raw_output = response.strip()
-            
-            # Clean up JSON formatting
-            raw_output = raw_output.replace('```json', '').replace('```', '').strip()
-            
-            try:
-                questions = json.loads(raw_output)
-                
-                # Validate structure
-                valid_questions = []
-                for q in questions:
-                    if all(key in q for key in ["question", "options", "answer"]):
-                        valid_questions.append(q)
-                
-                return valid_questions[:count]  # Ensure we don't exceed requested count
-                
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}")
-                print(f"Raw output: {raw_output}")
-                return []
+        except Exception:
+            logger.exception("AI generation error")
 
-        except Exception as e:
-            print(f"AI generation error: {e}")
-            return []
+        return questions[:count]  # Ensure we don't exceed requested count
 
     @staticmethod
     def calculate_score(quiz: Quiz, answers: List[QuizAnswerRequest]) -> int:
@@ -168,22 +164,29 @@ class QuizService:
 # Create router instance
 router = APIRouter()
 
-@router.get("/")
-async def get_quizzes(
+QUIZ_LIST_ADAPTER = TypeAdapter(List[QuizOut])
+
+@router.get("/", response_model=List[QuizOut])
+def get_quizzes(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Get all quizzes for the current user."""
-    try:
-        quizzes = db.query(Quiz).join(Document).filter(
+    def load() -> bytes:
+        quizzes = db.query(Quiz).options(selectinload(Quiz.questions)).join(Document).filter(
             Document.user_id == current_user.id
         ).all()
-        return [quiz.to_dict() for quiz in quizzes]
-    except Exception as e:
-        print(f"Error getting quizzes: {str(e)}")
+        return QUIZ_LIST_ADAPTER.dump_json(QUIZ_LIST_ADAPTER.validate_python(quizzes, from_attributes=True))
+
+    try:
+        # Served pre-serialized from the cache; invalidated whenever the user's quizzes change
+        body = cache_get_or_set(user_quizzes_key(current_user.id), "list", load)
+        return Response(content=body, media_type="application/json")
+    except Exception:
+        logger.exception("Error getting quizzes")
         raise HTTPException(status_code=500, detail="Failed to retrieve quizzes")
 
-@router.post("/generate")
+@router.post("/generate", response_model=QuizOut)
 async def generate_quiz(
     request: QuizGenerateRequest,
     db: Session = Depends(get_db),
@@ -200,7 +203,7 @@ async def generate_quiz(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        if document.processing_status.value != "processed":
+        if document.processing_status != ProcessingStatus.COMPLETED:
             raise HTTPException(
                 status_code=400, 
                 detail="Document must be fully processed before generating quiz"
@@ -213,32 +216,36 @@ async def generate_quiz(
         
         # Generate quiz
         quiz = await QuizService.generate_quiz_from_document(
-            document, difficulty, question_count
+            db, document, difficulty, question_count
         )
         
         # Save to database
-        db.add(quiz)
         db.commit()
-        db.refresh(quiz)
+        await asyncio.to_thread(cache_delete, user_quizzes_key(current_user.id))
+        
+        # Reload with questions eager-loaded for the response model
+        quiz = db.query(Quiz).options(selectinload(Quiz.questions)).filter(
+            Quiz.id == quiz.id
+        ).one()
         
-        return quiz.to_dict()
+        return quiz
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error generating quiz: {str(e)}")
+        logger.exception("Error generating quiz")
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {str(e)}")
 
-@router.get("/{quiz_id}")
-async def get_quiz(
+@router.get("/{quiz_id}", response_model=QuizOut)
+def get_quiz(
     quiz_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Get a specific quiz."""
-    try:
-        quiz = db.query(Quiz).join(Document).filter(
+    def load() -> bytes:
+        quiz = db.query(Quiz).options(selectinload(Quiz.questions)).join(Document).filter(
             Quiz.id == quiz_id,
             Document.user_id == current_user.id
         ).first()
@@ -246,15 +253,19 @@ async def get_quiz(
         if not quiz:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
-        return quiz.to_dict()
+        return QuizOut.model_validate(quiz).model_dump_json().encode()
+
+    try:
+        body = cache_get_or_set(user_quizzes_key(current_user.id), str(quiz_id), load)
+        return Response(content=body, media_type="application/json")
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting quiz {quiz_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error getting quiz %s", quiz_id)
         raise HTTPException(status_code=500, detail="Failed to retrieve quiz")
 
-@router.post("/{quiz_id}/submit")
-async def submit_quiz(
+@router.post("/{quiz_id}/submit", response_model=QuizSubmissionOut)
+def submit_quiz(
     quiz_id: int,
     request: QuizSubmissionRequest,
     db: Session = Depends(get_db),
@@ -262,8 +273,11 @@ async def submit_quiz(
 ):
     """Submit quiz answers and get results."""
     try:
-        # Get the quiz
-        quiz = db.query(Quiz).join(Document).filter(
+        # Get the quiz with just the columns scoring reads
+        quiz = db.query(Quiz).options(
+            load_only(Quiz.id),
+            selectinload(Quiz.questions).load_only(Question.id, Question.correct_answer)
+        ).join(Document).filter(
             Quiz.id == quiz_id,
             Document.user_id == current_user.id
         ).first()
@@ -283,59 +297,61 @@ async def submit_quiz(
             time_spent=None  # TODO: Add time tracking from frontend
         )
         
+        # No refresh after commit (expire_on_commit=False): completed_at comes back with the
+        # INSERT where the dialect supports RETURNING, otherwise it is loaded on first access
         db.add(submission)
         db.commit()
-        db.refresh(submission)
         
-        return submission.to_dict()
+        return submission
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error submitting quiz {quiz_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error submitting quiz %s", quiz_id)
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to submit quiz")
 
-@router.get("/{quiz_id}/submissions")
-async def get_quiz_submissions(
+@router.get("/{quiz_id}/submissions", response_model=List[QuizSubmissionOut])
+def get_quiz_submissions(
     quiz_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Get all submissions for a quiz by the current user."""
     try:
-        # Verify quiz ownership
-        quiz = db.query(Quiz).join(Document).filter(
+        # Ownership check and submissions in one round trip: the outer join yields
+        # one (quiz_id, None) row for an owned quiz without submissions, no rows otherwise
+        rows = db.query(Quiz.id, QuizSubmission).join(Document).outerjoin(
+            QuizSubmission,
+            and_(QuizSubmission.quiz_id == Quiz.id, QuizSubmission.user_id == current_user.id)
+        ).filter(
             Quiz.id == quiz_id,
             Document.user_id == current_user.id
-        ).first()
+        ).order_by(QuizSubmission.completed_at.desc()).all()
         
-        if not quiz:
+        if not rows:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
-        submissions = db.query(QuizSubmission).filter(
-            QuizSubmission.quiz_id == quiz_id,
-            QuizSubmission.user_id == current_user.id
-        ).order_by(QuizSubmission.completed_at.desc()).all()
-        
-        return [submission.to_dict() for submission in submissions]
+        return [submission for _, submission in rows if submission is not None]
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting submissions for quiz {quiz_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error getting submissions for quiz %s", quiz_id)
         raise HTTPException(status_code=500, detail="Failed to retrieve submissions")
 
 @router.delete("/{quiz_id}")
-async def delete_quiz(
+def delete_quiz(
     quiz_id: int,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_active_user)
 ):
     """Delete a quiz."""
     try:
-        # Verify quiz ownership
-        quiz = db.query(Quiz).join(Document).filter(
+        # Verify quiz ownership (load collections so the delete cascade can reach them)
+        quiz = db.query(Quiz).options(
+            selectinload(Quiz.questions), selectinload(Quiz.submissions)
+        ).join(Document).filter(
             Quiz.id == quiz_id,
             Document.user_id == current_user.id
         ).first()
@@ -346,14 +362,13 @@ async def delete_quiz(
         # Delete quiz (cascade will handle questions and submissions)
         db.delete(quiz)
         db.commit()
+        cache_delete(user_quizzes_key(current_user.id))
         
         return {"message": "Quiz deleted successfully"}
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error deleting quiz {quiz_id}: {str(e)}")
+    except Exception:
+        logger.exception("Error deleting quiz %s", quiz_id)
         db.rollback()
         raise HTTPException(status_code=500, detail="Failed to delete quiz")
-
-print("Quizzes router loaded successfully")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Dict, List
 from datetime import datetime
 
@@ -23,5 +23,4 @@ class AssessmentResult(BaseModel):
     reading_score: int
     completed_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True, str_strip_whitespace=True)
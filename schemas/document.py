@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, List, Any
 from datetime import datetime
 from models.document import ProcessingStatus
 
@@ -36,4 +36,29 @@ class DocumentResponse(DocumentBase):
 class DocumentSummary(BaseModel):
     summary: str
     word_count: int
-    key_topics: List[str]
\ No newline at end of file
+    key_topics: List[str]
+
+class DocumentOut(BaseModel):
+    """Document as returned to the frontend (camelCase keys, string ids)"""
+    model_config = ConfigDict(
+        from_attributes=True, coerce_numbers_to_str=True, frozen=True, str_strip_whitespace=True
+    )
+
+    id: str
+    name: str = Field(validation_alias="filename")
+    originalName: str = Field(validation_alias="original_name")
+    fileSize: int = Field(validation_alias="file_size")
+    mimeType: str = Field(validation_alias="mime_type")
+    status: ProcessingStatus = Field(validation_alias="processing_status")
+    uploadDate: Optional[datetime] = Field(default=None, validation_alias="uploaded_at")
+    processedAt: Optional[datetime] = Field(default=None, validation_alias="processed_at")
+    summary: Optional[str] = None
+    content: Optional[str] = None
+    pageCount: Optional[int] = Field(default=None, validation_alias="page_count")
+    tags: List[Any] = []
+    userId: str = Field(validation_alias="user_id")
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def default_tags(cls, v):
+        return v or []
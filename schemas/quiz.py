@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 from models.quiz import QuestionType, DifficultyLevel
 
@@ -42,7 +42,9 @@ class QuizResponse(QuizBase):
         from_attributes = True
 
 class QuizAttemptCreate(BaseModel):
-    answers: Dict[int, str]  # question_id -> answer
+    # Answers in question order (order_index). The question_id -> answer dict is
+    # deprecated and still accepted until clients send the ordered list.
+    answers: Union[List[str], Dict[int, str]]
 
 class QuizAttemptResponse(BaseModel):
     id: int
@@ -55,4 +57,52 @@ class QuizAttemptResponse(BaseModel):
     completed_at: Optional[datetime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Response models: built straight from the ORM objects (from_attributes) and
+# serialized by FastAPI, keeping the camelCase keys and string ids the frontend uses
+
+class QuestionOut(BaseModel):
+    model_config = ConfigDict(
+        from_attributes=True, coerce_numbers_to_str=True, frozen=True, str_strip_whitespace=True
+    )
+
+    id: str
+    text: str = Field(validation_alias="question_text")
+    type: QuestionType = Field(validation_alias="question_type")
+    options: Optional[List[Dict[str, Any]]] = Field(default=None, validation_alias="_parsed_options")
+    correctAnswer: str = Field(validation_alias="correct_answer")
+    explanation: Optional[str] = None
+
+class QuizOut(BaseModel):
+    model_config = ConfigDict(
+        from_attributes=True, coerce_numbers_to_str=True, frozen=True, str_strip_whitespace=True
+    )
+
+    id: str
+    title: str
+    description: Optional[str] = None
+    documentId: str = Field(validation_alias="document_id")
+    difficulty: DifficultyLevel
+    totalQuestions: int = Field(validation_alias="question_count")
+    estimatedDuration: int = Field(validation_alias="estimated_duration")
+    createdAt: Optional[datetime] = Field(default=None, validation_alias="created_at")
+    questions: List[QuestionOut]
+
+    @field_validator("estimatedDuration", mode="before")
+    @classmethod
+    def default_duration(cls, v):
+        return v or 10
+
+class QuizSubmissionOut(BaseModel):
+    model_config = ConfigDict(
+        from_attributes=True, coerce_numbers_to_str=True, frozen=True, str_strip_whitespace=True
+    )
+
+    id: str
+    quizId: str = Field(validation_alias="quiz_id")
+    userId: str = Field(validation_alias="user_id")
+    answers: Any
+    score: int
+    timeSpent: Optional[int] = Field(default=None, validation_alias="time_spent")
+    completedAt: Optional[datetime] = Field(default=None, validation_alias="completed_at")
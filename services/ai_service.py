@@ -1,50 +1,94 @@
 from typing import List, Dict, Any
 from config import settings
 from models.quiz import QuestionType, DifficultyLevel
-import json
-from huggingface_hub import AsyncInferenceClient  
+import re
+import orjson
+import asyncio
+import hashlib
+from services.llm_client import generate_text
+from services.cache import cache_get, cache_set
+from utils.tokens import prepare_llm_input
 
-# Initialize Hugging Face client
-client = AsyncInferenceClient(token=settings.HUGGINGFACEHUB_API_TOKEN)  # Changed client
+# Token budget for document text in prompts
+LLM_INPUT_TOKENS = 3500
+
+_WORD_RE = re.compile(r"\S+")
+
+LEARNING_STYLE_PROMPTS = {
+    "visual": "Focus on questions that can be answered by understanding diagrams, charts, or visual representations of concepts.",
+    "auditory": "Create questions that focus on explanations, discussions, and verbal understanding of concepts.",
+    "kinesthetic": "Generate practical, hands-on questions that relate to real-world applications and problem-solving.",
+    "reading": "Focus on text-based comprehension and written analysis questions."
+}
+
+# Invariant part of the quiz prompt (output format), kept first so providers with
+# prefix caching can reuse it; only the count, style and content follow
+QUIZ_PROMPT_FORMAT = """You are an expert educational content creator generating quiz questions.
+
+Return a JSON array of questions with this exact format:
+[
+    {
+        "question_text": "Question here?",
+        "question_type": "multiple_choice",
+        "correct_answer": "A",
+        "options": {"A": "Option 1", "B": "Option 2", "C": "Option 3", "D": "Option 4"},
+        "explanation": "Explanation of the correct answer",
+        "difficulty_level": "medium"
+    }
+]
+
+Question types: multiple_choice, true_false, short_answer
+Difficulty levels: easy, medium, hard
+"""
 
 class AIService:
     
     @staticmethod
     async def generate_summary(text: str) -> Dict[str, Any]:
+        # Counted without building a list of every word; shared by both return paths
+        word_count = sum(1 for _ in _WORD_RE.finditer(text))
+        
         try:
-            # Generate summary using Hugging Face
-            response = await client.text_generation(
-                prompt=f"Please provide a comprehensive summary of the following educational content, including key topics and main concepts:\n\n{text[:4000]}",
-                model="mistralai/Mistral-7B-Instruct-v0.2",
-                max_new_tokens=500,
-                temperature=0.3
+            # Clipped once by tokens and shared by both prompts
+            content = prepare_llm_input(text, LLM_INPUT_TOKENS)
+            
+            # Summary and key topics are independent requests; run them concurrently
+            response, topics_response = await asyncio.gather(
+                generate_text(
+                    prompt=f"Please provide a comprehensive summary of the following educational content, including key topics and main concepts:\n\n{content}",
+                    model="mistralai/Mistral-7B-Instruct-v0.2",
+                    max_new_tokens=500,
+                    temperature=0.3
+                ),
+                generate_text(
+                    prompt=f"Extract 5-7 key topics from the given text. Return as a JSON array of strings:\n\n{content}",
+                    model="mistralai/Mistral-7B-Instruct-v0.2",
+                    max_new_tokens=200,
+                    temperature=0.2
+                ),
+                return_exceptions=True
             )
             
+            # A failed summary fails the whole call; a failed topics request only loses the topics
+            if isinstance(response, Exception):
+                raise response
             summary = response.strip()
             
-            # Extract key topics
-            topics_response = await client.text_generation(
-                prompt=f"Extract 5-7 key topics from the given text. Return as a JSON array of strings:\n\n{text[:2000]}",
-                model="mistralai/Mistral-7B-Instruct-v0.2",
-                max_new_tokens=200,
-                temperature=0.2
-            )
-            
             try:
-                key_topics = json.loads(topics_response.strip())
+                key_topics = orjson.loads(topics_response)
             except:
                 key_topics = ["Topic analysis unavailable"]
             
             return {
                 "summary": summary,
-                "word_count": len(text.split()),
+                "word_count": word_count,
                 "key_topics": key_topics
             }
             
         except Exception as e:
             return {
                 "summary": "Summary generation failed. Please try again later.",
-                "word_count": len(text.split()),
+                "word_count": word_count,
                 "key_topics": ["Analysis unavailable"],
                 "error": str(e)
             }
@@ -52,47 +96,35 @@ class AIService:
     @staticmethod
     async def generate_quiz_questions(text: str, learning_style: str, num_questions: int = 10) -> List[Dict]:
         try:
-            learning_style_prompt = {
-                "visual": "Focus on questions that can be answered by understanding diagrams, charts, or visual representations of concepts.",
-                "auditory": "Create questions that focus on explanations, discussions, and verbal understanding of concepts.",
-                "kinesthetic": "Generate practical, hands-on questions that relate to real-world applications and problem-solving.",
-                "reading": "Focus on text-based comprehension and written analysis questions."
-            }
+            style = learning_style.lower()
+            if style not in LEARNING_STYLE_PROMPTS:
+                style = "reading"
+            style_instruction = LEARNING_STYLE_PROMPTS[style]
             
-            style_instruction = learning_style_prompt.get(learning_style.lower(), learning_style_prompt["reading"])
+            # Questions for the same text, style and count are reused across processes
+            cache_key = f"quiz_questions:{hashlib.sha256(text.encode()).hexdigest()}:{style}:{num_questions}"
+            cached = await asyncio.to_thread(cache_get, cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
             
-            prompt = f"""You are an expert educational content creator. Generate {num_questions} quiz questions based on the provided content.
-                        
-                        Learning style adaptation: {style_instruction}
-                        
-                        Return a JSON array of questions with this exact format:
-                        [
-                            {{
-                                "question_text": "Question here?",
-                                "question_type": "multiple_choice",
-                                "correct_answer": "A",
-                                "options": {{"A": "Option 1", "B": "Option 2", "C": "Option 3", "D": "Option 4"}},
-                                "explanation": "Explanation of the correct answer",
-                                "difficulty_level": "medium"
-                            }}
-                        ]
-                        
-                        Question types: multiple_choice, true_false, short_answer
-                        Difficulty levels: easy, medium, hard
-                        
-                        Generate quiz questions based on this content:
-                        {text[:3000]}
-                        """
+            prompt = (
+                f"{QUIZ_PROMPT_FORMAT}\n"
+                f"Generate {num_questions} quiz questions.\n"
+                f"Learning style adaptation: {style_instruction}\n\n"
+                f"Generate quiz questions based on this content:\n{prepare_llm_input(text, LLM_INPUT_TOKENS)}\n"
+            )
             
-            response = await client.text_generation(
+            response = await generate_text(
                 prompt=prompt,
                 model="koshkosh/quiz-generator",  # Using quiz generator model :cite[1]:cite[9]
                 max_new_tokens=2000,
                 temperature=0.4
             )
             
-            questions_json = response.strip()
-            questions = json.loads(questions_json)
+            questions = orjson.loads(response)
+            await asyncio.to_thread(
+                cache_set, cache_key, orjson.dumps(questions), settings.QUIZ_QUESTIONS_CACHE_TTL_SECONDS
+            )
             return questions
             
         except Exception as e:
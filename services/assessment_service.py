@@ -1,92 +1,98 @@
 from sqlalchemy.orm import Session
 from models.assessment import LearningAssessment
-from schemas.assessment import AssessmentSubmission
-from typing import List, Dict
+from schemas.assessment import AssessmentResponse, AssessmentSubmission
+from typing import List, Dict, Sequence
+import orjson
+
+# Answer keyword -> learning style, in priority order (an answer counts for the style
+# of the first keyword it contains); answers are lowercased once and matched by substring
+STYLE_KEYWORDS = {
+    "visual": "visual", "see": "visual", "diagram": "visual",
+    "hear": "auditory", "listen": "auditory", "discussion": "auditory",
+    "read": "reading", "write": "reading", "notes": "reading",
+    "hands-on": "kinesthetic", "practice": "kinesthetic", "physical": "kinesthetic",
+}
+LEARNING_STYLES = ("visual", "auditory", "reading", "kinesthetic")
+
+# Predefined assessment questions; static, so the response body is serialized once at import
+ASSESSMENT_QUESTIONS = (
+    {
+        "id": 1,
+        "question": "When learning something new, I prefer to:",
+        "options": [
+            "Read about it in detail",
+            "Watch a demonstration",
+            "Listen to someone explain it",
+            "Try it hands-on immediately"
+        ],
+        "category": "learning_preference"
+    },
+    {
+        "id": 2,
+        "question": "I remember information best when:",
+        "options": [
+            "I see it written down or in diagrams",
+            "I hear it explained verbally",
+            "I write notes or summaries",
+            "I practice or apply it physically"
+        ],
+        "category": "memory_style"
+    },
+    {
+        "id": 3,
+        "question": "When solving problems, I tend to:",
+        "options": [
+            "Draw diagrams or charts",
+            "Talk through the problem aloud",
+            "Write out the steps carefully",
+            "Jump in and experiment"
+        ],
+        "category": "problem_solving"
+    },
+    {
+        "id": 4,
+        "question": "In a classroom, I learn best when:",
+        "options": [
+            "There are visual aids and presentations",
+            "There's group discussion",
+            "I can take detailed notes",
+            "There are hands-on activities"
+        ],
+        "category": "classroom_preference"
+    },
+    {
+        "id": 5,
+        "question": "I prefer to study:",
+        "options": [
+            "Using highlighted texts and colorful materials",
+            "In quiet environments where I can focus",
+            "By reading and rereading materials",
+            "By moving around or using manipulatives"
+        ],
+        "category": "study_environment"
+    }
+)
+ASSESSMENT_QUESTIONS_JSON = orjson.dumps(ASSESSMENT_QUESTIONS)
 
 class AssessmentService:
     
     @staticmethod
-    def get_assessment_questions() -> List[Dict]:
+    def get_assessment_questions() -> Sequence[Dict]:
         """Return predefined assessment questions"""
-        return [
-            {
-                "id": 1,
-                "question": "When learning something new, I prefer to:",
-                "options": [
-                    "Read about it in detail",
-                    "Watch a demonstration",
-                    "Listen to someone explain it",
-                    "Try it hands-on immediately"
-                ],
-                "category": "learning_preference"
-            },
-            {
-                "id": 2,
-                "question": "I remember information best when:",
-                "options": [
-                    "I see it written down or in diagrams",
-                    "I hear it explained verbally",
-                    "I write notes or summaries",
-                    "I practice or apply it physically"
-                ],
-                "category": "memory_style"
-            },
-            {
-                "id": 3,
-                "question": "When solving problems, I tend to:",
-                "options": [
-                    "Draw diagrams or charts",
-                    "Talk through the problem aloud",
-                    "Write out the steps carefully",
-                    "Jump in and experiment"
-                ],
-                "category": "problem_solving"
-            },
-            {
-                "id": 4,
-                "question": "In a classroom, I learn best when:",
-                "options": [
-                    "There are visual aids and presentations",
-                    "There's group discussion",
-                    "I can take detailed notes",
-                    "There are hands-on activities"
-                ],
-                "category": "classroom_preference"
-            },
-            {
-                "id": 5,
-                "question": "I prefer to study:",
-                "options": [
-                    "Using highlighted texts and colorful materials",
-                    "In quiet environments where I can focus",
-                    "By reading and rereading materials",
-                    "By moving around or using manipulatives"
-                ],
-                "category": "study_environment"
-            }
-        ]
+        return ASSESSMENT_QUESTIONS
     
     @staticmethod
-    def calculate_learning_style(responses: List[Dict]) -> Dict:
+    def calculate_learning_style(responses: List[AssessmentResponse]) -> Dict:
         """Calculate learning style based on responses"""
-        scores = {
-            "visual": 0,
-            "auditory": 0,
-            "reading": 0,
-            "kinesthetic": 0
-        }
+        scores = dict.fromkeys(LEARNING_STYLES, 0)
         
-        # Simple scoring logic based on answer patterns
+        # Simple scoring logic based on answer keywords
         for response in responses:
-            answer = response["answer"]
-            if "visual" in answer.lower() or "see" in answer.lower() or "diagram" in answer.lower():
-                scores["visual"] += 1
-            elif "hear" in answer.lower() or "listen" in answer.lower() or "discussion" in answer.lower():
-                scores["auditory"] += 1
-            elif "read" in answer.lower() or "write" in answer.lower() or "notes" in answer.lower():
-                scores["reading"] += 1
-            elif "hands-on" in answer.lower() or "practice" in answer.lower() or "physical" in answer.lower():
-                scores["kinesthetic"] += 1
+            answer = response.answer.lower()
+            for keyword, style in STYLE_KEYWORDS.items():
+                if keyword in answer:
+                    scores[style] += 1
+                    break
         
         # Determine primary learning style
         primary_style = max(scores, key=scores.get)
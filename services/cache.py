@@ -0,0 +1,77 @@
+import logging
+from typing import Callable, Optional
+
+from redis import Redis, RedisError
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Response cache shared by all web processes and the Celery worker, so a write in any
+# of them invalidates it for the others. Without REDIS_URL nothing is cached: separate
+# per-process caches could not be invalidated across gunicorn workers.
+redis_client: Optional[Redis] = Redis.from_url(
+    settings.REDIS_URL,
+    socket_timeout=settings.REDIS_TIMEOUT_SECONDS,
+    socket_connect_timeout=settings.REDIS_TIMEOUT_SECONDS
+) if settings.REDIS_URL else None
+
+
+def user_quizzes_key(user_id: int) -> str:
+    """Hash holding a user's serialized quiz list ("list") and quizzes (by id)"""
+    return f"quizzes:{user_id}"
+
+
+def cache_get_or_set(key: str, field: str, loader: Callable[[], bytes],
+                     ttl: int = settings.RESPONSE_CACHE_TTL_SECONDS) -> bytes:
+    """Return field of the hash at key, filling it from loader() on a miss
+
+    Redis errors are logged and fall through to loader(), so an unavailable cache
+    only costs the DB queries it would have saved.
+    """
+    if redis_client is None:
+        return loader()
+    try:
+        cached = redis_client.hget(key, field)
+    except RedisError:
+        logger.warning("Cache read failed for %s", key, exc_info=True)
+        return loader()
+    if cached is not None:
+        return cached
+
+    value = loader()
+    try:
+        redis_client.pipeline().hset(key, field, value).expire(key, ttl).execute()
+    except RedisError:
+        logger.warning("Cache write failed for %s", key, exc_info=True)
+    return value
+
+
+def cache_delete(*keys: str):
+    """Invalidate cached entries; call after the write is committed"""
+    if redis_client is None or not keys:
+        return
+    try:
+        redis_client.delete(*keys)
+    except RedisError:
+        logger.warning("Cache invalidation failed for %s", keys, exc_info=True)
+
+
+def cache_get(key: str) -> Optional[bytes]:
+    """Value at key, or None on a miss, without Redis or when Redis fails"""
+    if redis_client is None:
+        return None
+    try:
+        return redis_client.get(key)
+    except RedisError:
+        logger.warning("Cache read failed for %s", key, exc_info=True)
+        return None
+
+
+def cache_set(key: str, value: bytes, ttl: int):
+    if redis_client is None:
+        return
+    try:
+        redis_client.set(key, value, ex=ttl)
+    except RedisError:
+        logger.warning("Cache write failed for %s", key, exc_info=True)
@@ -1,14 +1,19 @@
-import json, re, asyncio
+import asyncio
+import logging
+import orjson
 from fastapi import HTTPException
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from huggingface_hub import AsyncInferenceClient  # Changed import
 from database import SessionLocal
 from models.document import Document
-from models.quiz import Quiz
-import os
+from models.quiz import Quiz, Question, normalize_answer
+from services.llm_client import generate_text, json_grammar, DOCUMENT_ANALYSIS_SCHEMA
+from utils.tokens import prepare_llm_input
 
-# Initialize Hugging Face client
-client = AsyncInferenceClient(token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))  # Changed client
+logger = logging.getLogger(__name__)
+
+# Token budget for document text in prompts
+LLM_INPUT_TOKENS = 3500
 
 class DocumentService:
     @staticmethod
@@ -20,91 +25,86 @@ class DocumentService:
             if not document:
                 raise HTTPException(status_code=404, detail="Document not found")
 
-            text = document.content[:4000]  
-
-            summary, key_topics = await DocumentService.generate_summary_and_topics(text)
-            quiz_questions = await DocumentService.generate_quiz_questions(text)
-
-            document.summary = summary
-            document.key_topics = key_topics
-            for q in quiz_questions:
-                db.add(Quiz(
-                    document_id=document.id,
-                    question=q["question"],
-                    options=q["options"],
-                    answer=q["answer"]
-                ))
+            # Clipped to the token budget of the single analysis prompt
+            text = prepare_llm_input(document.content, LLM_INPUT_TOKENS)
+
+            # Summary, topics and quiz from one LLM call
+            artifacts = await DocumentService.generate_document_artifacts(text)
+            quiz_questions = artifacts["questions"]
+
+            document.summary = artifacts["summary"]
+            document.key_topics = artifacts["key_topics"]
+            if quiz_questions:
+                quiz = Quiz(document_id=document.id, title=f"Quiz: {document.filename[:50]}")
+                db.add(quiz)
+                db.flush()  # assigns quiz.id
+
+                # One multi-row INSERT for all questions instead of one per row
+                db.execute(insert(Question), [
+                    {
+                        "quiz_id": quiz.id,
+                        "question_text": q["question"],
+                        "options": q["options"],
+                        "correct_answer": q["answer"],
+                        "correct_answer_normalized": normalize_answer(q["answer"]),
+                        "order_index": i
+                    }
+                    for i, q in enumerate(quiz_questions)
+                ])
 
             db.commit()
             db.refresh(document)
 
-        except Exception as e:
+        except Exception:
             db.rollback()
-            print("❌ Error in process_document:", str(e))
+            logger.exception("Error in process_document %s", document_id)
             raise
         finally:
             db.close()
 
     @staticmethod
-    async def generate_summary_and_topics(text: str):
+    async def generate_document_artifacts(text: str) -> dict:
+        """Summary, key topics and quiz questions from a single structured LLM call"""
         prompt = f"""
         Analyze the following educational text and provide:
         1. A concise summary
         2. Key topics covered as a list
+        3. Multiple choice quiz questions based on the text
+
+        Return a JSON object with the keys "summary", "key_topics" and "questions".
+        Each question has "question", "options" (keys "A" to "D"), "answer" (the
+        correct option key) and "explanation".
 
         Text:
         {text}
         """
 
         try:
-            # Using Hugging Face text generation
-            response = await client.text_generation(
+            response = await generate_text(
                 prompt=prompt,
-                model="mistralai/Mistral-7B-Instruct-v0.2",  # Using a suitable model
-                max_new_tokens=500,
+                model="mistralai/Mistral-7B-Instruct-v0.2",
+                max_new_tokens=1500,
                 temperature=0.7,
+                # Decoding is constrained to the schema, so the output is always valid JSON
+                grammar=json_grammar(DOCUMENT_ANALYSIS_SCHEMA),
             )
+            return orjson.loads(response)
 
-            content = response
-            summary, key_topics = "", []
-
-            if "Key topics:" in content:
-                parts = content.split("Key topics:")
-                summary = parts[0].replace("Summary:", "").strip()
-                key_topics = [t.strip("-• \n") for t in parts[1].split("\n") if t.strip()]
-            else:
-                summary = content.strip()
+        except Exception:
+            logger.exception("Error generating document artifacts")
+            return {"summary": "Summary generation failed", "key_topics": [], "questions": []}
 
-            return summary, key_topics
-        
-        except Exception as e:
-            print(f"Error generating summary and topics: {e}")
-            return "Summary generation failed", []
+    @staticmethod
+    async def generate_summary_and_topics(text: str):
+        artifacts = await DocumentService.generate_document_artifacts(text)
+        return artifacts["summary"], artifacts["key_topics"]
 
     @staticmethod
     async def generate_quiz_questions(text: str):
-        try:
-            # Using Hugging Face's quiz generator model :cite[1]:cite[9]
-            response = await client.text_generation(
-                prompt=f"Generate quiz questions from: {text[:3000]}",
-                model="koshkosh/quiz-generator",  # Specific quiz generation model
-                max_new_tokens=700,
-                temperature=0.7,
-            )
-
-            raw_output = response.strip()
-            try:
-                return json.loads(raw_output)
-            except json.JSONDecodeError:
-                match = re.search(r"\[.*\]", raw_output, re.DOTALL)
-                if match:
-                    return json.loads(match.group(0))
-                print("❌ Raw AI output:", raw_output)
-                raise HTTPException(status_code=500, detail="AI response not valid JSON")
-        
-        except Exception as e:
-            print(f"Error generating quiz questions: {e}")
-            raise HTTPException(status_code=500, detail=f"Quiz generation failed: {str(e)}")
+        artifacts = await DocumentService.generate_document_artifacts(text)
+        if not artifacts["questions"]:
+            raise HTTPException(status_code=500, detail="Quiz generation failed")
+        return artifacts["questions"]
 
 # Wrapper for background tasks (unchanged)
 def process_document_background(document_id: int):
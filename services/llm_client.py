@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Optional, Protocol, Tuple, Type, TypeVar
+
+import orjson
+
+from huggingface_hub import AsyncInferenceClient, InferenceTimeoutError
+from huggingface_hub.errors import HfHubHTTPError
+from config import settings
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend(Protocol):
+    """Text generation provider behind generate_text/stream_text"""
+
+    # Errors rate_limited_call/backoff inspect for retries; timeouts are always retried
+    errors: Tuple[Type[Exception], ...]
+    timeout_errors: Tuple[Type[Exception], ...]
+
+    async def complete(self, prompt: str, model: str, max_new_tokens: int, **params) -> str: ...
+
+    async def stream(self, prompt: str, model: str, max_new_tokens: int, **params) -> AsyncIterator[str]:
+        """Open a streaming request; awaiting it raises if the request fails to start"""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class HFBackend:
+    """Hugging Face Inference API (text_generation)"""
+
+    errors = (HfHubHTTPError, InferenceTimeoutError)
+    timeout_errors = (InferenceTimeoutError,)
+
+    def __init__(self):
+        self.client = AsyncInferenceClient(
+            token=settings.HUGGINGFACEHUB_API_TOKEN,
+            timeout=settings.LLM_TIMEOUT_SECONDS
+        )
+
+    async def complete(self, prompt: str, model: str, max_new_tokens: int, **params) -> str:
+        return await self.client.text_generation(prompt=prompt, model=model, max_new_tokens=max_new_tokens, **params)
+
+    async def stream(self, prompt: str, model: str, max_new_tokens: int, **params) -> AsyncIterator[str]:
+        return await self.client.text_generation(
+            prompt=prompt, model=model, max_new_tokens=max_new_tokens, stream=True, **params
+        )
+
+    async def close(self):
+        await self.client.close()
+
+
+class OpenAIBackend:
+    """OpenAI chat completions
+
+    Callers name Hugging Face models; every request goes to settings.OPENAI_MODEL
+    instead. A text_generation JSON grammar becomes a json_schema response_format.
+    """
+
+    def __init__(self):
+        import openai
+
+        self.errors = (openai.APIStatusError, openai.APITimeoutError)
+        self.timeout_errors = (openai.APITimeoutError,)
+        # Retries are done by rate_limited_call, under the shared limits
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+            max_retries=0
+        )
+
+    @staticmethod
+    def request(prompt: str, max_new_tokens: int, temperature: Optional[float] = None, grammar: Optional[dict] = None) -> dict:
+        request = {
+            "model": settings.OPENAI_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_new_tokens,
+        }
+        if temperature is not None:
+            request["temperature"] = temperature
+        if grammar is not None:
+            request["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "schema": grammar["value"]},
+            }
+        return request
+
+    async def complete(self, prompt: str, model: str, max_new_tokens: int, **params) -> str:
+        response = await self.client.chat.completions.create(**self.request(prompt, max_new_tokens, **params))
+        return response.choices[0].message.content or ""
+
+    async def stream(self, prompt: str, model: str, max_new_tokens: int, **params) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            **self.request(prompt, max_new_tokens, **params), stream=True
+        )
+
+        async def chunks():
+            try:
+                async for event in response:
+                    if event.choices and event.choices[0].delta.content:
+                        yield event.choices[0].delta.content
+            finally:
+                await response.close()
+
+        return chunks()
+
+    async def close(self):
+        await self.client.close()
+
+
+LLM_BACKENDS = {"huggingface": HFBackend, "openai": OpenAIBackend}
+
+# Single backend (and client) shared by the routers, services and background tasks,
+# so they all reuse one connection pool. Closed from the app lifespan on shutdown.
+# Open connections are bounded by llm_semaphore below (one per in-flight request).
+backend: LLMBackend = LLM_BACKENDS[settings.LLM_BACKEND]()
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: int):
+        """Wait until `amount` tokens are available, then take them"""
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+# Process-wide limits shared by every LLM call (document processing and quiz generation)
+llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+token_bucket = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+
+
+async def rate_limited_call(make_call: Callable[[], Awaitable[T]], tokens_estimate: int) -> T:
+    """Run an LLM request under the concurrency/token limits, retrying rate limits and 5xx
+
+    `make_call` builds a fresh awaitable per attempt (a coroutine cannot be awaited twice).
+    """
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        await token_bucket.acquire(tokens_estimate)
+        try:
+            async with llm_semaphore:
+                return await make_call()
+        except backend.errors as e:
+            await backoff(e, attempt)
+
+
+async def backoff(error: Exception, attempt: int):
+    """Sleep before retrying a failed LLM request; re-raise if it is not retryable or retries ran out"""
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    retryable = isinstance(error, backend.timeout_errors) or status_code in RETRYABLE_STATUS_CODES
+    if not retryable or attempt == settings.LLM_MAX_RETRIES:
+        raise error
+    delay = 2 ** attempt + random.random()
+    logger.warning("LLM call failed (%s), retrying in %.1fs", status_code or "timeout", delay)
+    await asyncio.sleep(delay)
+
+
+def estimate_tokens(prompt: str, max_new_tokens: int) -> int:
+    """Rough token cost of a request (~4 characters per token) for the rate limiter"""
+    return len(prompt) // 4 + max_new_tokens
+
+
+class ResponseCache:
+    """LRU of LLM responses keyed by a hash of the full request (model, prompt, parameters)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, str] = OrderedDict()
+
+    @staticmethod
+    def key(**request) -> str:
+        return hashlib.blake2b(orjson.dumps(request, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        response = self.entries.get(key)
+        if response is not None:
+            self.entries.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: str):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = response
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache(settings.LLM_CACHE_SIZE)
+
+
+def cacheable(params: dict) -> bool:
+    """Only deterministic requests are cached; sampled output (temperature > 0) is meant to vary"""
+    return not params.get("temperature")
+
+
+async def generate_text(prompt: str, model: str, max_new_tokens: int, **params) -> str:
+    """backend.complete behind the response cache (greedy requests only), rate limits and retries"""
+    use_cache = cacheable(params)
+    key = ResponseCache.key(prompt=prompt, model=model, max_new_tokens=max_new_tokens, **params)
+    cached = response_cache.get(key) if use_cache else None
+    if cached is not None:
+        return cached
+
+    response = await rate_limited_call(
+        lambda: backend.complete(prompt=prompt, model=model, max_new_tokens=max_new_tokens, **params),
+        tokens_estimate=estimate_tokens(prompt, max_new_tokens),
+    )
+    if use_cache:
+        response_cache.put(key, response)
+    return response
+
+
+async def stream_text(prompt: str, model: str, max_new_tokens: int, **params) -> AsyncIterator[str]:
+    """backend.stream behind the response cache (greedy requests only), rate limits and retries
+
+    Yields generated text as it is decoded. Opening the stream is retried like
+    rate_limited_call. Closing the generator early (use contextlib.aclosing) ends the
+    request, so the server stops decoding. Only a stream that runs to the end is
+    cached, so a later request is never served a truncated response.
+    """
+    use_cache = cacheable(params)
+    key = ResponseCache.key(prompt=prompt, model=model, max_new_tokens=max_new_tokens, stream=True, **params)
+    cached = response_cache.get(key) if use_cache else None
+    if cached is not None:
+        yield cached
+        return
+
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        await token_bucket.acquire(estimate_tokens(prompt, max_new_tokens))
+        async with llm_semaphore:
+            try:
+                stream = await backend.stream(prompt=prompt, model=model, max_new_tokens=max_new_tokens, **params)
+            except backend.errors as e:
+                error = e
+            else:
+                chunks = []
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+                if use_cache:
+                    response_cache.put(key, "".join(chunks))
+                return
+        await backoff(error, attempt)
+
+# JSON schemas passed as text_generation(grammar=...): the server constrains decoding
+# to them, so responses parse with a plain json.loads (no fence stripping/regex)
+QUIZ_QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {
+            "type": "object",
+            "properties": {key: {"type": "string"} for key in ("A", "B", "C", "D")},
+            "required": ["A", "B", "C", "D"],
+        },
+        "answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+        "explanation": {"type": "string"},
+    },
+    "required": ["question", "options", "answer", "explanation"],
+}
+
+QUIZ_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {"type": "array", "items": QUIZ_QUESTION_SCHEMA},
+    },
+    "required": ["questions"],
+}
+
+DOCUMENT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "key_topics": {"type": "array", "items": {"type": "string"}},
+        "questions": {"type": "array", "items": QUIZ_QUESTION_SCHEMA},
+    },
+    "required": ["summary", "key_topics", "questions"],
+}
+
+
+def json_grammar(schema: dict) -> dict:
+    """text_generation grammar argument constraining output to a JSON schema"""
+    return {"type": "json", "value": schema}
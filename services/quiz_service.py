@@ -1,22 +1,27 @@
+from sqlalchemy import insert, func
 from sqlalchemy.orm import Session
-from models.quiz import Quiz, Question, QuizAttempt
+from models.quiz import Quiz, Question, QuizAttempt, normalize_answer
 from models.assessment import LearningAssessment
 from models.document import Document
 from schemas.quiz import QuizCreate, QuizAttemptCreate, QuizAttemptResponse
 from services.ai_service import AIService
 from fastapi import HTTPException, status
-from datetime import datetime
 from typing import List, Dict
 
 class QuizService:
     
     @staticmethod
     async def generate_quiz(db: Session, quiz_data: QuizCreate, user_id: int) -> Quiz:
-        # Get document
-        document = db.query(Document).filter(
+        # Document and the user's latest learning style in one query
+        latest_style = db.query(LearningAssessment.learning_style_result).filter(
+            LearningAssessment.user_id == user_id
+        ).order_by(LearningAssessment.completed_at.desc()).limit(1).scalar_subquery()
+        
+        row = db.query(Document, latest_style).filter(
             Document.id == quiz_data.document_id,
             Document.user_id == user_id
         ).first()
+        document, learning_style = row if row else (None, None)
         
         if not document or not document.extracted_text:
             raise HTTPException(
@@ -24,50 +29,52 @@ class QuizService:
                 detail="Document not found or not processed"
             )
         
-        # Get user's learning style
-        assessment = db.query(LearningAssessment).filter(
-            LearningAssessment.user_id == user_id
-        ).order_by(LearningAssessment.completed_at.desc()).first()
-        
-        learning_style = assessment.learning_style_result if assessment else "reading"
+        learning_style = learning_style or "reading"
         
-        # Create quiz
-        db_quiz = Quiz(
-            document_id=quiz_data.document_id,
-            user_id=user_id,
-            title=quiz_data.title,
-            description=quiz_data.description
-        )
-        
-        db.add(db_quiz)
-        db.commit()
-        db.refresh(db_quiz)
-        
-        # Generate questions using AI
+        # Generate questions using AI (before any writes, so no transaction is held open)
         questions_data = await AIService.generate_quiz_questions(
             document.extracted_text, 
             learning_style
         )
         
-        # Create question objects
-        for i, question_data in enumerate(questions_data):
-            db_question = Question(
-                quiz_id=db_quiz.id,
-                question_text=question_data["question_text"],
-                question_type=question_data["question_type"],
-                correct_answer=question_data["correct_answer"],
-                options=question_data.get("options"),
-                explanation=question_data.get("explanation"),
-                difficulty_level=question_data["difficulty_level"],
-                order_index=i
+        # Quiz and questions are written in one transaction; a failure leaves neither
+        try:
+            # Create quiz
+            db_quiz = Quiz(
+                document_id=quiz_data.document_id,
+                user_id=user_id,
+                title=quiz_data.title,
+                description=quiz_data.description,
+                total_questions=len(questions_data)
             )
-            db.add(db_question)
-        
-        # Update total questions count
-        db_quiz.total_questions = len(questions_data)
-        
-        db.commit()
-        db.refresh(db_quiz)
+            
+            db.add(db_quiz)
+            db.flush()  # assigns db_quiz.id
+            
+            # Insert all question rows with one multi-row INSERT
+            if questions_data:
+                db.execute(insert(Question), [
+                    {
+                        "quiz_id": db_quiz.id,
+                        "question_text": question_data["question_text"],
+                        "question_type": question_data["question_type"],
+                        "correct_answer": question_data["correct_answer"],
+                        "correct_answer_normalized": normalize_answer(question_data["correct_answer"]),
+                        "options": question_data.get("options"),
+                        "explanation": question_data.get("explanation"),
+                        "difficulty_level": question_data["difficulty_level"],
+                        "order_index": i
+                    }
+                    for i, question_data in enumerate(questions_data)
+                ])
+            
+            # No refresh SELECT: the session keeps loaded state on commit (expire_on_commit=False).
+            # Server defaults come back with the INSERT where the dialect supports RETURNING,
+            # otherwise they are loaded on first access
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         
         return db_quiz
     
@@ -93,23 +100,45 @@ class QuizService:
     
     @staticmethod
     def submit_quiz_attempt(db: Session, quiz_id: int, user_id: int, attempt_data: QuizAttemptCreate) -> QuizAttemptResponse:
-        quiz = QuizService.get_quiz(db, quiz_id, user_id)
+        # Ownership check and correct answers (in question order) in one query: the outer
+        # join yields one all-None row for an owned quiz without questions, no rows otherwise
+        rows = db.query(
+            Question.id, Question.correct_answer, Question.correct_answer_normalized
+        ).select_from(Quiz).outerjoin(
+            Question, Question.quiz_id == Quiz.id
+        ).filter(
+            Quiz.id == quiz_id,
+            Quiz.user_id == user_id,
+            Quiz.is_active == True
+        ).order_by(Question.order_index).all()
         
-        # Get quiz questions
-        questions = db.query(Question).filter(Question.quiz_id == quiz_id).all()
+        if not rows:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Quiz not found"
+            )
+        questions = [row for row in rows if row.id is not None]
+        # Rows written outside the ORM before the column was backfilled can lack the normalized copy
+        expected_answers = [
+            row.correct_answer_normalized if row.correct_answer_normalized is not None
+            else normalize_answer(row.correct_answer)
+            for row in questions
+        ]
+        
+        answers = attempt_data.answers
+        if isinstance(answers, dict):  # deprecated question_id -> answer form
+            answers = [answers.get(row.id, "") for row in questions]
         
         # Calculate score
-        correct_answers = 0
         total_questions = len(questions)
-        
-        for question in questions:
-            user_answer = attempt_data.answers.get(str(question.id))
-            if user_answer and user_answer.lower().strip() == question.correct_answer.lower().strip():
-                correct_answers += 1
+        correct_answers = sum(
+            1 for answer, correct_answer in zip(answers, expected_answers)
+            if answer and normalize_answer(answer) == correct_answer
+        )
         
         score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
         
-        # Create quiz attempt
+        # Create quiz attempt (completed_at is stamped by the database clock)
         db_attempt = QuizAttempt(
             quiz_id=quiz_id,
             user_id=user_id,
@@ -117,11 +146,10 @@ class QuizService:
             score=score,
             total_questions=total_questions,
             correct_answers=correct_answers,
-            completed_at=datetime.utcnow()
+            completed_at=func.now()
         )
         
         db.add(db_attempt)
         db.commit()
-        db.refresh(db_attempt)
         
         return db_attempt
\ No newline at end of file
@@ -4,7 +4,8 @@ Test script for document upload endpoint
 Run this after starting your FastAPI server
 """
 
-import requests
+import asyncio
+import httpx
 import json
 import tempfile
 import os
@@ -30,10 +31,10 @@ Applications:
 Machine learning has revolutionized many industries and continues to be one of the most important technological advances of our time.
 """
 
-def test_health():
+async def check_health(client: httpx.AsyncClient):
     """Test if the server is running"""
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             print("✅ Server is healthy")
             return True
@@ -44,7 +45,7 @@ def test_health():
         print(f"❌ Cannot connect to server: {e}")
         return False
 
-def test_upload():
+async def check_upload(client: httpx.AsyncClient):
     """Test document upload"""
     try:
         # Create a temporary file
@@ -55,7 +56,7 @@ def test_upload():
         # Upload the file
         with open(temp_file_path, 'rb') as f:
             files = {'file': ('test_document.txt', f, 'text/plain')}
-            response = requests.post(f"{BASE_URL}/api/documents/upload", files=files)
+            response = await client.post("/api/documents/upload", files=files)
         
         # Clean up
         os.unlink(temp_file_path)
@@ -76,10 +77,10 @@ def test_upload():
         print(f"❌ Upload error: {e}")
         return None
 
-def test_get_documents():
+async def check_get_documents(client: httpx.AsyncClient):
     """Test getting all documents"""
     try:
-        response = requests.get(f"{BASE_URL}/api/documents/")
+        response = await client.get("/api/documents/")
         if response.status_code == 200:
             documents = response.json()
             print(f"✅ Retrieved {len(documents)} documents")
@@ -93,14 +94,14 @@ def test_get_documents():
         print(f"❌ Get documents error: {e}")
         return False
 
-def test_get_document(doc_id):
+async def check_get_document(client: httpx.AsyncClient, doc_id):
     """Test getting a specific document"""
     if not doc_id:
         print("⏭️  Skipping document detail test (no document ID)")
         return False
         
     try:
-        response = requests.get(f"{BASE_URL}/api/documents/{doc_id}")
+        response = await client.get(f"/api/documents/{doc_id}")
         if response.status_code == 200:
             document = response.json()
             print(f"✅ Retrieved document details for ID {doc_id}")
@@ -114,38 +115,34 @@ def test_get_document(doc_id):
         print(f"❌ Get document error: {e}")
         return False
 
-def main():
+async def main():
     """Run all tests"""
     print("🧪 Testing AI Tutoring Backend API")
     print("=" * 40)
     
-    # Test server health
-    if not test_health():
-        print("\n❌ Server is not running. Start it with:")
-        print("   uvicorn main:app --reload --host 0.0.0.0 --port 8000")
-        return
-    
-    print()
-    
-    # Test document upload
-    print("🔄 Testing document upload...")
-    doc_id = test_upload()
-    
-    print()
-    
-    # Test getting all documents
-    print("🔄 Testing get all documents...")
-    test_get_documents()
-    
-    print()
-    
-    # Test getting specific document
-    print("🔄 Testing get specific document...")
-    test_get_document(doc_id)
+    # One client for all requests, so they reuse keep-alive connections
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        # Test server health
+        if not await check_health(client):
+            print("\n❌ Server is not running. Start it with:")
+            print("   uvicorn main:app --reload --host 0.0.0.0 --port 8000")
+            return
+        
+        print()
+        
+        # Test document upload
+        print("🔄 Testing document upload...")
+        doc_id = await check_upload(client)
+        
+        print()
+        
+        # Listing and detail are independent reads of the upload; run them concurrently
+        print("🔄 Testing get all documents and get specific document...")
+        await asyncio.gather(check_get_documents(client), check_get_document(client, doc_id))
     
     print()
     print("🎉 Testing complete!")
     print(f"📚 Visit {BASE_URL}/docs to see the full API documentation")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -1,20 +1,15 @@
 import os
-import shutil
-from typing import BinaryIO
+import aiofiles
 from fastapi import UploadFile, HTTPException
-import PyPDF2
-from io import BytesIO
 from config import settings
 
+# Lowercased once; settings are read-only after load
+ALLOWED_EXTENSIONS = frozenset(map(str.lower, settings.ALLOWED_FILE_TYPES))
+
 def validate_file(file: UploadFile) -> bool:
-    if file.size > settings.MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
-        )
-    
-    file_extension = file.filename.split(".")[-1].lower()
-    if file_extension not in settings.ALLOWED_FILE_TYPES:
+    # The size is enforced by save_file while streaming; file.size is client-declared
+    file_extension = os.path.splitext(file.filename)[1][1:].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail=f"File type not allowed. Allowed types: {settings.ALLOWED_FILE_TYPES}"
@@ -22,26 +17,49 @@ def validate_file(file: UploadFile) -> bool:
     
     return True
 
+SAVE_CHUNK_SIZE = 1024 * 1024
+
 async def save_file(file: UploadFile, file_path: str) -> str:
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Streamed in chunks without blocking the event loop, counting the size as we go
+    # and stopping as soon as it exceeds the limit
+    file_size = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(SAVE_CHUNK_SIZE):
+                file_size += len(chunk)
+                if file_size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB limit"
+                    )
+                await buffer.write(chunk)
+    except Exception:
+        # Don't leave a partial file behind
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
     
     return file_path
 
 def extract_text_from_pdf(file_path: str) -> str:
+    import pypdfium2 as pdfium
+
     try:
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            return text.strip()
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            parts = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                parts.append(textpage.get_text_range())
+                textpage.close()
+                page.close()
+            return "\n".join(parts).strip()
+        finally:
+            pdf.close()
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error extracting text from PDF: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,49 @@
+from typing import List, Optional
+
+import orjson
+
+
+class JSONArrayItemScanner:
+    """Pull complete objects out of the first JSON array of a document streamed in chunks
+
+    Feeding '{"questions": [{"a": 1}, {"b"' returns [{"a": 1}]; the second object is
+    returned by the feed() call that completes it. Output cut off mid-item still
+    yields every item that was closed before the cut.
+    """
+
+    def __init__(self):
+        self.stack: List[str] = []  # open brackets
+        self.array_depth: Optional[int] = None  # stack depth of the array being read
+        self.item: List[str] = []  # characters of the object being read
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> List[dict]:
+        """Consume the next chunk; return the objects it completed"""
+        items = []
+        for char in text:
+            inside_item = self.array_depth is not None and len(self.stack) > self.array_depth
+            if inside_item:
+                self.item.append(char)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.stack.append(char)
+                if self.array_depth is None and char == "[":
+                    self.array_depth = len(self.stack)
+                elif not inside_item and char == "{" and self.array_depth == len(self.stack) - 1:
+                    self.item = [char]
+            elif char in "]}" and self.stack:
+                self.stack.pop()
+                if char == "}" and self.array_depth == len(self.stack):
+                    items.append(orjson.loads("".join(self.item)))
+                    self.item = []
+        return items
@@ -0,0 +1,54 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Optional
+
+# Trailing back matter that adds nothing to a summary or quiz
+BACK_MATTER_HEADING = re.compile(
+    r"^\s*(references|bibliography|works cited|index)\s*$", re.IGNORECASE | re.MULTILINE
+)
+
+CHARS_PER_TOKEN = 4  # English average, used when the tokenizer is unavailable
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """cl100k_base encoder, loaded once (first use downloads its BPE file); None if unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Tokenizer unavailable, clipping by characters: %s", e)
+        return None
+
+
+def strip_back_matter(text: str) -> str:
+    """Drop a trailing references/bibliography/index section"""
+    matches = list(BACK_MATTER_HEADING.finditer(text))
+    # Only a heading in the second half of the document marks back matter
+    if matches and matches[-1].start() > len(text) // 2:
+        return text[:matches[-1].start()].rstrip()
+    return text
+
+
+def clip_tokens(text: str, max_tokens: int, encoding: Optional[object] = None) -> str:
+    """Cut text to at most max_tokens tokens, always on a token boundary"""
+    # Every token is at least one character, so short texts cannot exceed the budget
+    if len(text) <= max_tokens:
+        return text
+
+    encoding = encoding or get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def prepare_llm_input(text: str, max_tokens: int) -> str:
+    """Document text for a prompt: back matter removed, clipped to the token budget"""
+    return clip_tokens(strip_back_matter(text), max_tokens)
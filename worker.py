@@ -0,0 +1,54 @@
+# worker.py
+"""
+Celery worker for document processing
+Start with: celery -A worker worker --concurrency=8
+"""
+
+import asyncio
+from typing import Optional
+from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from config import settings
+from routers.documents import DocumentService
+
+celery = Celery("tutor", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+celery.conf.update(
+    # Redelivered only if the worker dies mid-task; failures inside the task are
+    # recorded on the document (status "failed") by DocumentService, not retried
+    task_acks_late=True,
+    worker_prefetch_multiplier=1
+)
+
+# One event loop per worker process: the shared LLM client, semaphore and token
+# bucket are bound to the loop they were first used on. Created after the prefork,
+# never at import: children would otherwise share the parent's loop and its fds.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# uvloop where available (not on Windows), as in the web workers. Importing it in the
+# parent is fine; only the loops themselves must not cross the fork.
+try:
+    from uvloop import new_event_loop as _new_event_loop
+except ImportError:
+    _new_event_loop = asyncio.new_event_loop
+
+@worker_process_init.connect
+def init_event_loop(**kwargs):
+    """Give each prefork child its own event loop"""
+    global _loop
+    _loop = _new_event_loop()
+
+@worker_process_shutdown.connect
+def close_event_loop(**kwargs):
+    """Close the child's loop (and the handles it holds) before the process exits"""
+    global _loop
+    if _loop is not None:
+        _loop.close()
+        _loop = None
+
+@celery.task
+def process_document(document_id: int):
+    """Extract text, generate summary, topics, and quiz for a document"""
+    global _loop
+    if _loop is None:  # the solo pool runs tasks in the main process, without worker_process_init
+        _loop = _new_event_loop()
+    _loop.run_until_complete(DocumentService.process_document(document_id))